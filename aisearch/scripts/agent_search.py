@@ -9,6 +9,7 @@ import dspy
 import torch
 from gnais.config import Config
 from gnais.search.agent import agent_search
+from gnais.search.corpus import memory_embedder
 from mem0 import Memory
 from mem0.configs.base import MemoryConfig
 
@@ -57,17 +58,13 @@ if __name__ == "__main__":
                 "api_key": Config.API_KEY,
             },
         },
-        embedder={
-            "provider": "huggingface",
-            "config": {
-                "model": "Qwen/Qwen3-Embedding-0.6B",
-                "embedding_dims": 1024,
-                "model_kwargs": {
-                    "trust_remote_code": True,
-                    "device": "cuda" if torch.cuda.is_available() else "cpu",
-                },
-            },
-        },
+        embedder=memory_embedder(
+            "Qwen/Qwen3-Embedding-0.6B",
+            Config.EMBED_DIM,
+            Config.EMBED_CACHE_PATH,
+            Config.EMBED_THREADS or None,
+            Config.EMBED_SERVER,
+        ),
         vector_store={
             "provider": "chroma",
             "config": {
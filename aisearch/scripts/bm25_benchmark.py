@@ -0,0 +1,79 @@
+"""Benchmark the native BM25 retriever against langchain's BM25Retriever.
+
+Reports build time, single-query latency, batched throughput and how
+often both retrievers agree on the top-k documents."""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from gnais.config import Config
+from gnais.search.corpus import BM25IndexRetriever, build_bm25_index, get_docs
+from langchain_community.retrievers import BM25Retriever
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def _latencies(retriever, queries: list[str]) -> tuple[list, np.ndarray]:
+    results, timings = [], []
+    for query in queries:
+        docs, elapsed = _timed(retriever.invoke, query)
+        results.append(docs)
+        timings.append(elapsed)
+    return results, np.array(timings) * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--corpus-path", default=Config.CORPUS_PATH)
+    parser.add_argument(
+        "--queries",
+        default="data/small_benchmark.csv",
+        help="CSV file with a 'query' column",
+    )
+    parser.add_argument("-k", type=int, default=3)
+    args = parser.parse_args()
+
+    docs = get_docs(args.corpus_path)
+    queries = pd.read_csv(args.queries, usecols=["query"])["query"].tolist()
+    print(f"{len(docs)} documents, {len(queries)} queries, k={args.k}\n")
+
+    baseline, baseline_build = _timed(
+        BM25Retriever.from_texts,
+        texts=docs,
+        metadatas=[{"source": f"Document {ind + 1}"} for ind in range(len(docs))],
+        k=args.k,
+    )
+    index, native_build = _timed(build_bm25_index, docs)
+    native = BM25IndexRetriever(index=index, docs=docs, k=args.k)
+
+    baseline_docs, baseline_ms = _latencies(baseline, queries)
+    native_docs, native_ms = _latencies(native, queries)
+    _, batch_seconds = _timed(native.batch, queries)
+
+    overlap = np.mean(
+        [
+            len({d.page_content for d in expected} & {d.page_content for d in got})
+            / max(len(expected), 1)
+            for expected, got in zip(baseline_docs, native_docs)
+        ]
+    )
+    summary = pd.DataFrame(
+        {
+            "build (s)": [baseline_build, native_build],
+            "mean latency (ms)": [baseline_ms.mean(), native_ms.mean()],
+            "p95 latency (ms)": [
+                np.percentile(baseline_ms, 95),
+                np.percentile(native_ms, 95),
+            ],
+            "batch throughput (q/s)": [np.nan, len(queries) / batch_seconds],
+        },
+        index=["langchain BM25Retriever", "gnais BM25IndexRetriever"],
+    )
+    print(summary.to_string(float_format=lambda x: f"{x:.3f}"))
+    print(f"\nTop-{args.k} overlap with BM25Retriever: {overlap:.1%}")
@@ -0,0 +1,159 @@
+"""Build the on-disk retrieval indexes for the GeneNetwork corpus.
+
+Run this once after fetching metadata (and after every refresh) so
+search processes can memory-map the indexes instead of rebuilding them
+at startup.  Each run builds a complete index set in a new version
+directory and then switches INDEX_PATH/current to it in one step."""
+
+import argparse
+import json
+import os
+import shutil
+import time
+from functools import partial
+from pathlib import Path
+
+from gnais.config import Config
+from gnais.search.corpus import (
+    build_bm25_index,
+    build_doc_store,
+    build_entity_index,
+    build_vector_index,
+    get_embed_model,
+    index_root,
+    init_chroma_db,
+    iter_typed_docs,
+    new_index_version,
+    publish_index_version,
+)
+from gnais.search.embeddings import ShardedEmbedder
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--corpus-path",
+        default=Config.CORPUS_PATH,
+        help="Directory with the corpus files (default: CORPUS_PATH)",
+    )
+    parser.add_argument(
+        "--index-path",
+        default=Config.INDEX_PATH,
+        help="Directory to write the indexes to (default: INDEX_PATH)",
+    )
+    parser.add_argument(
+        "--sync-chroma",
+        action="store_true",
+        help="Also embed new documents into the Chroma collection",
+    )
+    parser.add_argument(
+        "--vectors",
+        action="store_true",
+        help="Also embed the corpus into the local vector index",
+    )
+    parser.add_argument(
+        "--nlist",
+        type=int,
+        default=None,
+        help="IVF clusters for the local vector index (default: sqrt(#docs))",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Embed with this many CPU worker processes (default: serial)",
+    )
+    parser.add_argument(
+        "--threads-per-worker",
+        type=int,
+        default=None,
+        help="Torch threads per worker (default: #cores / --workers)",
+    )
+    args = parser.parse_args()
+    checkpoint_dir = Path(args.index_path) / "embed_checkpoints"
+    previous = index_root(args.index_path)
+    version = new_index_version(args.index_path)
+
+    # The corpus is streamed from disk by every step, never loaded whole
+    start = time.monotonic()
+    docs = build_doc_store(iter_typed_docs(args.corpus_path), version / "docs")
+    print(
+        f"Wrote document store ({len(docs)} documents, {len(docs.shards)} type "
+        f"shards) in {time.monotonic() - start:.2f}s"
+    )
+
+    start = time.monotonic()
+    index = build_bm25_index(docs)
+    index.save(version / "bm25")
+    print(
+        f"Built BM25 index over {index.n_docs} documents ({len(index.vocab)} "
+        f"terms, {len(index.indices)} postings) in {time.monotonic() - start:.2f}s"
+    )
+
+    start = time.monotonic()
+    entities = build_entity_index(docs)
+    entities.save(version / "entities")
+    print(
+        f"Built entity index ({len(entities.keys)} identifiers and labels) in "
+        f"{time.monotonic() - start:.2f}s"
+    )
+
+    embed_model = partial(
+        get_embed_model,
+        "Qwen/Qwen3-Embedding-0.6B",
+        Config.EMBED_DIM,
+        Config.EMBED_CACHE_PATH,
+    )
+
+    if args.vectors:
+        start = time.monotonic()
+        if args.workers:
+            embedding = ShardedEmbedder(
+                embed_model,
+                namespace=f"Qwen/Qwen3-Embedding-0.6B@{Config.EMBED_DIM}",
+                checkpoint_dir=checkpoint_dir,
+                workers=args.workers,
+                threads_per_worker=args.threads_per_worker,
+            )
+        else:
+            embedding = embed_model()
+        build_vector_index(
+            docs,
+            embedding,
+            version / "vectors",
+            nlist=args.nlist,
+            seed=Config.SEED,
+        )
+        print(f"Built local vector index in {time.monotonic() - start:.2f}s")
+        if not args.workers:
+            print(f"Embedding cache: {dict(embedding.stats)}")
+    elif (previous / "vectors" / "meta.json").exists():
+        meta = json.loads((previous / "vectors" / "meta.json").read_text())
+        if meta["fingerprint"] == docs.fingerprint:
+            # Same corpus: hard-link the previous vectors into the new set
+            shutil.copytree(
+                previous / "vectors", version / "vectors", copy_function=os.link
+            )
+        else:
+            print("The corpus changed; rebuild the local vector index with --vectors")
+
+    publish_index_version(args.index_path, version)
+    print(f"Published index version {version.name}")
+
+    if args.sync_chroma:
+        start = time.monotonic()
+        _, stats = init_chroma_db(
+            docs,
+            embed_model="Qwen/Qwen3-Embedding-0.6B",
+            dimension=Config.EMBED_DIM,
+            embed_cache=Config.EMBED_CACHE_PATH,
+            workers=args.workers,
+            checkpoint_dir=checkpoint_dir,
+            threads_per_worker=args.threads_per_worker,
+        )
+        print(
+            f"Synced Chroma in {time.monotonic() - start:.2f}s: "
+            f"{stats['added']} added, {stats['deleted']} deleted, "
+            f"{stats['retagged']} re-tagged, {stats['unchanged']} unchanged"
+        )
+        if "embedding_cache" in stats:
+            print(f"Embedding cache: {stats['embedding_cache']}")
@@ -0,0 +1,41 @@
+"""Serve the embedding model to all web workers from one process.
+
+Start it before the web app and set EMBED_SERVER to the same address in
+the app's environment; the workers then embed through it instead of
+loading their own copy of the model."""
+
+import argparse
+import asyncio
+
+from gnais.config import Config
+from gnais.search.corpus import get_embed_model
+from gnais.search.embed_server import create_app
+from hypercorn.asyncio import serve
+from hypercorn.config import Config as HypercornConfig
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--bind",
+        default=Config.EMBED_SERVER or "unix:/tmp/gnais-embed.sock",
+        help="unix:/path/to.sock or http://host:port (default: EMBED_SERVER)",
+    )
+    parser.add_argument("--model", default="Qwen/Qwen3-Embedding-0.6B")
+    parser.add_argument("--dimension", type=int, default=Config.EMBED_DIM)
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=Config.EMBED_THREADS or None,
+        help="Torch threads for the batched forward passes",
+    )
+    args = parser.parse_args()
+
+    embedding = get_embed_model(
+        args.model, args.dimension, Config.EMBED_CACHE_PATH, True, args.threads
+    )
+    # Load the model now rather than on the first request
+    embedding.embed_query("warmup")
+    config = HypercornConfig()
+    config.bind = [args.bind.removeprefix("http://")]
+    print(f"Serving {args.model} ({args.dimension} dimensions) on {args.bind}")
+    asyncio.run(serve(create_app(embedding, args.model, args.dimension), config))
@@ -192,9 +192,19 @@ TYPE_QUERIES = [
 ]
 
 
-def type_pattern_to_filename(type_pattern: str) -> str:
+def type_pattern_to_filename(type_pattern: str, extension: str = "json") -> str:
     """Convert a type pattern to a safe filename."""
-    return f"{type_pattern.split(':')[-1].lower()}.json"
+    return f"{type_pattern.split(':')[-1].lower()}.{extension}"
+
+
+def write_sentences(sentences: List[str], output_path: str, output_format: str):
+    """Write sentences as a JSON array, or one JSON string per line."""
+    with open(output_path, "w") as f:
+        if output_format == "jsonl":
+            for sentence in sentences:
+                f.write(json.dumps(sentence) + "\n")
+        else:
+            json.dump(sentences, f, indent=2)
 
 
 def uri_to_prefixed(uri: str) -> str:
@@ -372,7 +382,10 @@ def build_sentences(grouped: Dict[str, List[Tuple[str, str]]]) -> List[str]:
 
 
 def process_type_query(
-    type_pattern: str, output_dir: str, page_size: int = 5000
+    type_pattern: str,
+    output_dir: str,
+    page_size: int = 5000,
+    output_format: str = "json",
 ) -> Tuple[str, int, bool]:
     """Process a single type query and write results to a file.
 
@@ -380,11 +393,12 @@ def process_type_query(
         type_pattern: The type pattern to query
         output_dir: Directory to write the output file
         page_size: Number of triples per page
+        output_format: "json" for a JSON array, "jsonl" for JSON Lines
 
     Returns:
         Tuple of (type_pattern, count, success)
     """
-    filename = type_pattern_to_filename(type_pattern)
+    filename = type_pattern_to_filename(type_pattern, output_format)
     output_path = os.path.join(output_dir, filename)
 
     # Add delay at start to stagger requests when running in parallel
@@ -395,8 +409,7 @@ def process_type_query(
         bindings = fetch_by_type_pattern(type_pattern, page_size=page_size)
 
         if not bindings:
-            with open(output_path, "w") as f:
-                json.dump([], f, indent=2)
+            write_sentences([], output_path, output_format)
             return type_pattern, 0, True
 
         print(f"  Processing {len(bindings)} triples for {type_pattern}")
@@ -405,9 +418,7 @@ def process_type_query(
         print(f"  Grouped into {len(grouped)} subjects")
 
         sentences = build_sentences(grouped)
-
-        with open(output_path, "w") as f:
-            json.dump(sentences, f, indent=2)
+        write_sentences(sentences, output_path, output_format)
 
         print(f"  Wrote {len(sentences)} sentences to {filename}")
         return type_pattern, len(sentences), True
@@ -441,6 +452,13 @@ def main():
         default=5000,
         help="Number of triples per page (default: 5000)",
     )
+    parser.add_argument(
+        "--format",
+        "-f",
+        choices=("json", "jsonl"),
+        default="json",
+        help="Output format; jsonl streams best for large corpora (default: json)",
+    )
     args = parser.parse_args()
 
     os.makedirs(args.output_dir, exist_ok=True)
@@ -454,7 +472,9 @@ def main():
     if args.workers == 1:
         # Sequential processing - more polite to the server
         for type_pattern in TYPE_QUERIES:
-            result = process_type_query(type_pattern, args.output_dir, args.page_size)
+            result = process_type_query(
+                type_pattern, args.output_dir, args.page_size, args.format
+            )
             results.append(result)
             # Delay between types
             time.sleep(1.0)
@@ -463,7 +483,7 @@ def main():
         with ThreadPoolExecutor(max_workers=args.workers) as executor:
             future_to_type = {
                 executor.submit(
-                    process_type_query, tq, args.output_dir, args.page_size
+                    process_type_query, tq, args.output_dir, args.page_size, args.format
                 ): tq
                 for tq in TYPE_QUERIES
             }
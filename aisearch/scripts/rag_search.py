@@ -13,10 +13,11 @@ from mem0.configs.base import MemoryConfig
 from gnais.config import Config
 from gnais.search.classification import classify_search, extract_keywords
 from gnais.search.corpus import (
-    create_ensemble_retriever,
-    get_chroma_db,
-    get_docs,
+    create_hybrid_retriever,
+    get_vector_db,
     init_chroma_db,
+    load_corpus,
+    memory_embedder,
 )
 from gnais.search.prompts import GN_FACT_EXTRACTION_PROMPT, GN_UPDATE_MEMORY_PROMPT
 from gnais.search.rag import rag_search
@@ -33,13 +34,33 @@ def _digest(
 
     async def _run() -> str:
 
-        docs = get_docs(corpus_path)
-        chroma_db = get_chroma_db(embed_model="Qwen/Qwen3-Embedding-0.6B")
-        decision = classify_search(query).get("decision")
-        retriever = create_ensemble_retriever(
-            chroma_db=chroma_db,
+        docs = load_corpus(Config.INDEX_PATH, corpus_path)
+        chroma_db = get_vector_db(
+            backend=Config.VECTOR_BACKEND,
+            embed_model="Qwen/Qwen3-Embedding-0.6B",
+            index_path=Config.INDEX_PATH,
             docs=docs,
+            search=Config.VECTOR_SEARCH,
+            quantization=Config.VECTOR_QUANTIZATION,
+            dimension=Config.EMBED_DIM,
+            embed_cache=Config.EMBED_CACHE_PATH,
+            # The web app's arguments: one shared model instance
+            batch_queries=True,
+            embed_threads=Config.EMBED_THREADS or None,
+            embed_server=Config.EMBED_SERVER,
+        )
+        # Classified and bound like ragent._rag_search, so this measures
+        # the retriever that is served
+        classification = classify_search(query, tuple(sorted(docs.shards)))
+        decision = classification.get("decision")
+        retriever = create_hybrid_retriever(
+            vector_db=chroma_db,
+            docs=docs,
+            index_path=Config.INDEX_PATH,
+        ).bind(
             keyword_weight=0.7 if decision == "keyword" else 0.5,
+            types=classification.get("entity_types") or None,
+            exact=decision == "keyword",
         )
 
         parts = []
@@ -84,17 +105,13 @@ if __name__ == "__main__":
                 "api_key": Config.API_KEY,
             },
         },
-        embedder={
-            "provider": "huggingface",
-            "config": {
-                "model": "Qwen/Qwen3-Embedding-0.6B",
-                "embedding_dims": 1024,
-                "model_kwargs": {
-                    "trust_remote_code": True,
-                    "device": "cuda" if torch.cuda.is_available() else "cpu",
-                },
-            },
-        },
+        embedder=memory_embedder(
+            "Qwen/Qwen3-Embedding-0.6B",
+            Config.EMBED_DIM,
+            Config.EMBED_CACHE_PATH,
+            Config.EMBED_THREADS or None,
+            Config.EMBED_SERVER,
+        ),
         vector_store={
             "provider": "chroma",
             "config": {
@@ -0,0 +1,67 @@
+"""Benchmark SPARQL fan-out latency with and without connection pooling.
+
+Each round sends --concurrency queries at once, as GraphRAG does, either
+through a fresh httpx client per query (the old behaviour) or through
+the shared pooled clients of gnais.search.sparql."""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+import numpy as np
+from gnais.config import Config
+from gnais.search.sparql import SPARQL_CLIENTS
+
+DEFAULT_QUERY = "SELECT ?s WHERE { ?s ?p ?o } LIMIT 1"
+
+
+async def _post(client: httpx.AsyncClient, endpoint: str, query: str) -> None:
+    response = await client.post(
+        endpoint,
+        data={"query": query},
+        headers={"Accept": "application/sparql-results+json"},
+    )
+    response.raise_for_status()
+
+
+async def _fresh(endpoint: str, query: str) -> None:
+    async with httpx.AsyncClient(timeout=SPARQL_CLIENTS.timeout) as client:
+        await _post(client, endpoint, query)
+
+
+async def _pooled(endpoint: str, query: str) -> None:
+    await _post(SPARQL_CLIENTS.get(endpoint), endpoint, query)
+
+
+async def _rounds(fetch, endpoint: str, query: str, rounds: int, concurrency: int):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        await asyncio.gather(*(fetch(endpoint, query) for _ in range(concurrency)))
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.array(timings)
+
+
+async def main(args: argparse.Namespace) -> None:
+    for name, fetch in (("fresh client", _fresh), ("pooled client", _pooled)):
+        # Warm up the endpoint's own caches (and the pool) first
+        await _rounds(fetch, args.endpoint, args.query, 1, args.concurrency)
+        timings = await _rounds(
+            fetch, args.endpoint, args.query, args.rounds, args.concurrency
+        )
+        print(
+            f"{name:>14}: p50 {np.percentile(timings, 50):8.1f} ms, "
+            f"p95 {np.percentile(timings, 95):8.1f} ms per round of "
+            f"{args.concurrency} queries"
+        )
+    await SPARQL_CLIENTS.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--endpoint", default=Config.SPARQL_ENDPOINT)
+    parser.add_argument("--query", default=DEFAULT_QUERY)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=12)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,291 @@
+"""Benchmark the import and startup time of the web app and the scripts.
+
+Every entry point is loaded in a fresh interpreter run with
+``-X importtime``. The benchmark records:
+
+- the import time of each module (third-party packages are summed per
+  top-level package; gnais modules are kept individually);
+- for ``web.app``, the time from starting the process to answering its
+  first request, including the before_serving warmup;
+- for each script, the time to load it, i.e. its module-level code
+  without the ``__main__`` block.
+
+The network backends are replaced by offline stand-ins so the benchmark
+runs anywhere:
+
+- the Chroma server by an in-memory client;
+- the Hugging Face model by deterministic fake embeddings;
+- the mem0 memory by a no-op;
+- the Redis rate-limit storage by memory.
+
+Pass --live to keep the real ones.
+
+Results are appended to a JSON-lines history.  Entry points that got more
+than --tolerance slower than the median of the previous runs are reported
+as regressions, and the script then exits with status 1."""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+_IMPORT_TIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def entry_points() -> list[str]:
+    """``web.app`` and every script that can be imported without running
+    it (the rdf2partial_text converters run at import time)."""
+    scripts = sorted(
+        str(path.relative_to(ROOT))
+        for path in (ROOT / "scripts").glob("*.py")
+        if path.name != Path(__file__).name
+        and 'if __name__ == "__main__"' in path.read_text()
+    )
+    return ["web.app"] + scripts
+
+
+def _offline_backends() -> None:
+    """Swap the network backends for in-process stand-ins.  This runs
+    before the entry point is imported, so ``from x import y`` picks up
+    the replacements."""
+    import chromadb
+    import flask_limiter
+    import langchain_huggingface
+    import mem0
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    chromadb.HttpClient = lambda **kwargs: chromadb.EphemeralClient()
+
+    def _fake_embeddings(model_kwargs=None, **kwargs):
+        size = (model_kwargs or {}).get("truncate_dim") or 1024
+        return DeterministicFakeEmbedding(size=size)
+
+    langchain_huggingface.HuggingFaceEmbeddings = _fake_embeddings
+
+    class _OfflineMemory:
+        def __init__(self, config=None):
+            self.config = config
+
+        def search(self, *args, **kwargs):
+            return {"results": []}
+
+        def add(self, *args, **kwargs):
+            return {"results": []}
+
+    mem0.Memory = _OfflineMemory
+
+    limiter_init = flask_limiter.Limiter.__init__
+
+    def _memory_limiter(self, *args, **kwargs):
+        kwargs["storage_uri"] = "memory://"
+        limiter_init(self, *args, **kwargs)
+
+    flask_limiter.Limiter.__init__ = _memory_limiter
+
+
+def _run_child(entry_point: str, live: bool) -> dict:
+    """Load *entry_point* in this (fresh) interpreter and time it."""
+    start = time.perf_counter()
+    if not live:
+        _offline_backends()
+    result = {}
+    if entry_point == "web.app":
+        import asyncio
+        import importlib
+
+        app = importlib.import_module("web.app").app
+        result["import_s"] = time.perf_counter() - start
+
+        async def _first_request():
+            async with app.test_app() as test_app:
+                response = await test_app.test_client().get("/login")
+                return response.status_code
+
+        request_start = time.perf_counter()
+        status = asyncio.run(_first_request())
+        result["first_request_s"] = time.perf_counter() - request_start
+        result["status"] = status
+    else:
+        import runpy
+
+        sys.argv = [entry_point]
+        runpy.run_path(str(ROOT / entry_point), run_name="startup_benchmark")
+        result["import_s"] = time.perf_counter() - start
+    result["startup_s"] = time.perf_counter() - start
+    return result
+
+
+def _module_times(importtime: str) -> dict[str, float]:
+    """Self import time per module, in seconds, from ``-X importtime``
+    output; third-party modules are summed per top-level package."""
+    times: dict[str, float] = {}
+    for line in importtime.splitlines():
+        match = _IMPORT_TIME.match(line)
+        if not match:
+            continue
+        name = match.group(4)
+        if not name.startswith(("gnais", "web")):
+            name = name.split(".")[0]
+        times[name] = times.get(name, 0.0) + int(match.group(1)) / 1e6
+    return {
+        name: round(seconds, 4)
+        for name, seconds in sorted(times.items(), key=lambda item: -item[1])
+        if seconds >= 0.001
+    }
+
+
+def measure(entry_point: str, live: bool = False) -> dict:
+    """Time *entry_point* in a fresh interpreter with ``-X importtime``."""
+    with tempfile.NamedTemporaryFile(suffix=".json") as output:
+        paths = [str(ROOT / "src"), os.environ.get("PYTHONPATH", "")]
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, paths)))
+        command = [
+            sys.executable,
+            "-X",
+            "importtime",
+            __file__,
+            "--child",
+            entry_point,
+            "--child-output",
+            output.name,
+        ] + (["--live"] if live else [])
+        start = time.perf_counter()
+        process = subprocess.run(
+            command, cwd=ROOT, env=env, capture_output=True, text=True
+        )
+        wall = time.perf_counter() - start
+        if process.returncode != 0:
+            error = process.stderr.strip().splitlines()
+            return {"error": error[-1] if error else f"exit {process.returncode}"}
+        result = json.loads(Path(output.name).read_text())
+    result["process_s"] = wall
+    result["modules"] = _module_times(process.stderr)
+    return result
+
+
+def _git_commit() -> str | None:
+    process = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    return process.stdout.strip() or None
+
+
+def regressions(
+    history: list[dict], run: dict, window: int, tolerance: float
+) -> list[str]:
+    """Entry points whose startup time exceeds the median of the last
+    *window* runs by more than *tolerance*."""
+    found = []
+    for entry_point, result in run["results"].items():
+        previous = [
+            past["results"][entry_point]["startup_s"]
+            for past in history[-window:]
+            if "startup_s" in past["results"].get(entry_point, {})
+        ]
+        if not previous or "startup_s" not in result:
+            continue
+        baseline = statistics.median(previous)
+        if result["startup_s"] > baseline * (1 + tolerance):
+            found.append(
+                f"{entry_point}: {result['startup_s']:.2f}s "
+                f"(median of last {len(previous)} runs: {baseline:.2f}s)"
+            )
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "entry_points",
+        nargs="*",
+        help="web.app and/or script paths (default: all of them)",
+    )
+    parser.add_argument(
+        "--history",
+        default="data/startup_benchmark.jsonl",
+        help="JSON-lines file the results are appended to",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=5,
+        help="Compare against the median of this many previous runs",
+    )
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument(
+        "--modules", type=int, default=8, help="Slowest modules to print"
+    )
+    parser.add_argument(
+        "--live", action="store_true", help="Use the real backends (not offline)"
+    )
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--child-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = _run_child(args.child, args.live)
+        Path(args.child_output).write_text(json.dumps(result))
+        sys.exit(0)
+
+    run = {
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "live": args.live,
+        "results": {},
+    }
+    for entry_point in args.entry_points or entry_points():
+        # The fastest of the repeats is the least disturbed by other load
+        results = [measure(entry_point, args.live) for _ in range(args.repeat)]
+        timed = [result for result in results if "startup_s" in result]
+        result = min(timed, key=lambda r: r["startup_s"]) if timed else results[0]
+        run["results"][entry_point] = result
+        if "error" in result:
+            print(f"{entry_point}: failed: {result['error']}")
+            continue
+        first_request = (
+            f", first request {result['first_request_s']:.2f}s"
+            if "first_request_s" in result
+            else ""
+        )
+        print(
+            f"{entry_point}: import {result['import_s']:.2f}s, startup "
+            f"{result['startup_s']:.2f}s{first_request} "
+            f"(process {result['process_s']:.2f}s)"
+        )
+        for name, seconds in list(result["modules"].items())[: args.modules]:
+            print(f"    {name:<40} {seconds:.3f}s")
+
+    history_path = Path(args.history)
+    history = []
+    if history_path.exists():
+        history = [
+            json.loads(line)
+            for line in history_path.read_text().splitlines()
+            if line.strip()
+        ]
+    history = [past for past in history if past.get("live") == args.live]
+    slower = regressions(history, run, args.window, args.tolerance)
+    history_path.parent.mkdir(parents=True, exist_ok=True)
+    with history_path.open("a") as f:
+        f.write(json.dumps(run) + "\n")
+    print(f"\nAppended results to {history_path}")
+    if slower:
+        print("Startup regressions:")
+        for line in slower:
+            print(f"    {line}")
+        sys.exit(1)
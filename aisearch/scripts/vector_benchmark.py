@@ -0,0 +1,83 @@
+"""Benchmark recall@k, latency and memory of the local vector index modes.
+
+Exact float16 search is the ground truth.  Queries are the benchmark
+questions plus a random sample of corpus documents."""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from gnais.config import Config
+from gnais.search.corpus import get_embed_model, load_corpus, load_vector_index
+
+MODES = [
+    ("exact", "none"),
+    ("exact", "int8"),
+    ("exact", "binary"),
+    ("ivf", "none"),
+    ("ivf", "int8"),
+    ("ivf", "binary"),
+]
+
+
+def _memory(store) -> int:
+    """Bytes scanned by the first pass of a search mode."""
+    if store.quantization == "int8":
+        return store.quantized["int8"].nbytes
+    if store.quantization == "binary":
+        return store.quantized["binary"].nbytes
+    return store.vectors.nbytes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--index-path", default=Config.INDEX_PATH)
+    parser.add_argument(
+        "--queries",
+        default="data/small_benchmark.csv",
+        help="CSV file with a 'query' column",
+    )
+    parser.add_argument("--sample", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    docs = load_corpus(args.index_path)
+    embedding = get_embed_model("Qwen/Qwen3-Embedding-0.6B", Config.EMBED_DIM)
+    rng = np.random.default_rng(Config.SEED)
+    sampled = rng.choice(len(docs), size=min(args.sample, len(docs)), replace=False)
+    queries = pd.read_csv(args.queries, usecols=["query"])["query"].tolist()
+    queries += [docs[i] for i in sampled]
+    embedded = embedding.embed_documents(queries)
+    print(f"{len(docs)} documents, {len(queries)} queries, k={args.k}\n")
+
+    stores = {
+        mode: load_vector_index(
+            str(docs.index_dir / "vectors"),
+            docs,
+            embedding,
+            search=mode[0],
+            quantization=mode[1],
+            dimension=Config.EMBED_DIM,
+        )
+        for mode in MODES
+    }
+    truth = [set(stores[MODES[0]]._search_rows(q, args.k)[0]) for q in embedded]
+    float32_bytes = stores[MODES[0]].vectors.size * 4
+
+    rows = {}
+    for mode, store in stores.items():
+        timings, recalls = [], []
+        for query, expected in zip(embedded, truth):
+            start = time.perf_counter()
+            found, _ = store._search_rows(query, args.k)
+            timings.append((time.perf_counter() - start) * 1000)
+            recalls.append(len(expected & set(found)) / max(len(expected), 1))
+        rows[f"{mode[0]}/{mode[1]}"] = {
+            f"recall@{args.k}": np.mean(recalls),
+            "mean latency (ms)": np.mean(timings),
+            "p95 latency (ms)": np.percentile(timings, 95),
+            "first-pass memory (MB)": _memory(store) / 2**20,
+            "vs float32": float32_bytes / _memory(store),
+        }
+    print(pd.DataFrame(rows).T.to_string(float_format=lambda x: f"{x:.3f}"))
@@ -18,6 +18,42 @@ class Config:
 
     MEM0_PATH = os.path.join(DB_PATH, "mem0_chroma")
 
+    # On-disk retrieval indexes built by scripts/build_index.py
+    INDEX_PATH = os.environ.get("INDEX_PATH", os.path.join(DB_PATH, "index"))
+
+    # "chroma" queries the Chroma server; "local" searches INDEX_PATH/vectors
+    VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "chroma")
+    if VECTOR_BACKEND not in ("chroma", "local"):
+        raise ValueError("VECTOR_BACKEND must be 'chroma' or 'local'")
+
+    VECTOR_SEARCH = os.environ.get("VECTOR_SEARCH", "exact")
+    if VECTOR_SEARCH not in ("exact", "ivf"):
+        raise ValueError("VECTOR_SEARCH must be 'exact' or 'ivf'")
+
+    # First-pass storage for the local backend, re-ranked exactly afterwards
+    VECTOR_QUANTIZATION = os.environ.get("VECTOR_QUANTIZATION", "none")
+    if VECTOR_QUANTIZATION not in ("none", "int8", "binary"):
+        raise ValueError("VECTOR_QUANTIZATION must be 'none', 'int8' or 'binary'")
+
+    # Matryoshka output size of the Qwen3 embeddings (32-1024); changing it
+    # requires rebuilding the vector indexes and the mem0 store
+    EMBED_DIM = int(os.environ.get("EMBED_DIM", "1024"))
+    if not 32 <= EMBED_DIM <= 1024:
+        raise ValueError("EMBED_DIM must be between 32 and 1024")
+
+    # SQLite store of document embeddings reused across index builds
+    EMBED_CACHE_PATH = os.environ.get(
+        "EMBED_CACHE_PATH", os.path.join(DB_PATH, "embedding_cache.sqlite")
+    )
+
+    # Torch threads of a serving process, set when the batched query model
+    # loads; process-wide (0 = torch's default)
+    EMBED_THREADS = int(os.environ.get("EMBED_THREADS", "0"))
+
+    # Shared embedding server (scripts/embed_server.py) as unix:/path or
+    # http://host:port; unset, every process loads its own model
+    EMBED_SERVER = os.environ.get("EMBED_SERVER") or None
+
     SEED = int(os.environ.get("SEED"))
     if SEED is None:
         raise RuntimeError("SEED is not set")
@@ -52,6 +88,43 @@ class Config:
     if SPARQL_ENDPOINT is None:
         raise RuntimeError("SPARQL_ENDPOINT is not set")
 
+    # Connection pool shared by all SPARQL queries to an endpoint
+    SPARQL_MAX_CONNECTIONS = int(os.environ.get("SPARQL_MAX_CONNECTIONS", "20"))
+    SPARQL_KEEPALIVE_CONNECTIONS = int(
+        os.environ.get("SPARQL_KEEPALIVE_CONNECTIONS", "10")
+    )
+    SPARQL_KEEPALIVE_EXPIRY = float(os.environ.get("SPARQL_KEEPALIVE_EXPIRY", "30"))
+    # Used for https endpoints when the h2 package is installed
+    SPARQL_HTTP2 = os.environ.get("SPARQL_HTTP2", "1") == "1"
+    # Queries in flight per endpoint start at INITIAL_CONCURRENCY, grow
+    # while they answer within LATENCY_TARGET seconds and halve on 5xx or
+    # timeouts (never above SPARQL_MAX_CONNECTIONS)
+    SPARQL_INITIAL_CONCURRENCY = int(os.environ.get("SPARQL_INITIAL_CONCURRENCY", "4"))
+    SPARQL_LATENCY_TARGET = float(os.environ.get("SPARQL_LATENCY_TARGET", "5"))
+    # Circuit breaker: stop querying an endpoint for BREAKER_OPEN_FOR seconds
+    # once BREAKER_FAILURE_RATE of at least BREAKER_MIN_CALLS queries in the
+    # last BREAKER_WINDOW seconds failed (5xx, timeout or slower than
+    # BREAKER_SLOW_CALL seconds)
+    SPARQL_BREAKER_FAILURE_RATE = float(
+        os.environ.get("SPARQL_BREAKER_FAILURE_RATE", "0.5")
+    )
+    SPARQL_BREAKER_MIN_CALLS = int(os.environ.get("SPARQL_BREAKER_MIN_CALLS", "5"))
+    SPARQL_BREAKER_WINDOW = float(os.environ.get("SPARQL_BREAKER_WINDOW", "60"))
+    SPARQL_BREAKER_SLOW_CALL = float(os.environ.get("SPARQL_BREAKER_SLOW_CALL", "30"))
+    SPARQL_BREAKER_OPEN_FOR = float(os.environ.get("SPARQL_BREAKER_OPEN_FOR", "30"))
+
+    # Redis cache of SPARQL results (seconds; 0 disables it).  The optional
+    # probe query's result is part of the cache version, so a data load
+    # that changes it invalidates the cache; it runs every VERSION_INTERVAL
+    SPARQL_CACHE_TTL = int(os.environ.get("SPARQL_CACHE_TTL", "86400"))
+    SPARQL_VERSION_QUERY = os.environ.get("SPARQL_VERSION_QUERY") or None
+    SPARQL_VERSION_INTERVAL = float(os.environ.get("SPARQL_VERSION_INTERVAL", "300"))
+    # After a failed probe: keep the last version (or skip the cache) this long
+    SPARQL_VERSION_RETRY = float(os.environ.get("SPARQL_VERSION_RETRY", "30"))
+    # The endpoint's default graph: "FROM <it>" is then redundant, and
+    # dropped when canonicalizing queries
+    SPARQL_DEFAULT_GRAPH = os.environ.get("SPARQL_DEFAULT_GRAPH") or None
+
     AUTH_SERVER_URL = os.environ.get("AUTH_SERVER_URL")
     if AUTH_SERVER_URL is None:
         raise RuntimeError("AUTH_SERVER_URL is not set")
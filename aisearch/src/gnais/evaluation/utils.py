@@ -11,10 +11,11 @@ import pandas as pd
 from gnais.config import Config
 from gnais.search.agent import agent_search
 from gnais.search.classification import classify_search, extract_keywords
-from gnais.search.corpus import create_ensemble_retriever, get_chroma_db, get_docs
+from gnais.search.corpus import create_hybrid_retriever, get_vector_db, load_corpus
 from gnais.search.grag import graph_rag_search
 from gnais.search.rag import rag_search
 from gnais.search.ragent import hybrid_search
+from gnais.search.sparql import SPARQL_CLIENTS
 
 
 def get_dataset(
@@ -74,21 +75,48 @@ _TOOL_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search")
 def _run_async(async_fn, *args, **kwargs):
     """Run async function in a separate thread with a fresh event loop"""
 
+    async def _run_and_close():
+        try:
+            return await async_fn(*args, **kwargs)
+        finally:
+            # The pooled SPARQL clients are bound to this throwaway loop
+            await SPARQL_CLIENTS.aclose()
+
     def _worker():
-        return asyncio.run(async_fn(*args, **kwargs))
+        return asyncio.run(_run_and_close())
 
     return _TOOL_EXECUTOR.submit(_worker).result()
 
 
 def rag_digest(query: str, memory: Any = None) -> str:
     async def _run() -> str:
-        docs = get_docs(Config.CORPUS_PATH)
-        chroma_db = get_chroma_db(embed_model="Qwen/Qwen3-Embedding-0.6B")
-        decision = classify_search(query).get("decision")
-        retriever = create_ensemble_retriever(
-            chroma_db=chroma_db,
+        docs = load_corpus(Config.INDEX_PATH, Config.CORPUS_PATH)
+        chroma_db = get_vector_db(
+            backend=Config.VECTOR_BACKEND,
+            embed_model="Qwen/Qwen3-Embedding-0.6B",
+            index_path=Config.INDEX_PATH,
+            docs=docs,
+            search=Config.VECTOR_SEARCH,
+            quantization=Config.VECTOR_QUANTIZATION,
+            dimension=Config.EMBED_DIM,
+            embed_cache=Config.EMBED_CACHE_PATH,
+            # The web app's arguments: one shared model instance
+            batch_queries=True,
+            embed_threads=Config.EMBED_THREADS or None,
+            embed_server=Config.EMBED_SERVER,
+        )
+        # Classified and bound like ragent._rag_search, so this measures
+        # the retriever that is served
+        classification = classify_search(query, tuple(sorted(docs.shards)))
+        decision = classification.get("decision")
+        retriever = create_hybrid_retriever(
+            vector_db=chroma_db,
             docs=docs,
+            index_path=Config.INDEX_PATH,
+        ).bind(
             keyword_weight=0.7 if decision == "keyword" else 0.5,
+            types=classification.get("entity_types") or None,
+            exact=decision == "keyword",
         )
 
         parts = []
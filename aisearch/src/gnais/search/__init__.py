@@ -1,5 +1,30 @@
-from gnais.search.agent import agent_search
-from gnais.search.classification import classify_search, extract_keywords
-from gnais.search.grag import graph_rag_search
-from gnais.search.rag import rag_search
-from gnais.search.ragent import hybrid_search
+"""GeneNetwork AI search.
+
+The search entry points are imported from their modules on first access,
+so importing one submodule (or the package) does not pull in the others
+and their dependencies."""
+
+from importlib import import_module
+
+_EXPORTS = {
+    "agent_search": "gnais.search.agent",
+    "classify_search": "gnais.search.classification",
+    "extract_keywords": "gnais.search.classification",
+    "graph_rag_search": "gnais.search.grag",
+    "rag_search": "gnais.search.rag",
+    "hybrid_search": "gnais.search.ragent",
+}
+
+__all__ = tuple(_EXPORTS)
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -4,6 +4,7 @@ from typing import Any
 
 import dspy
 from gnais.search.prompts import GENERAL_SYSTEM_PROMPT
+from gnais.search.sparql import SPARQL_BREAKERS, CircuitOpenError
 from gnais.search.tools import (
     MemoryTools,
     check_link,
@@ -76,6 +77,11 @@ async def agent_search(
     memory=None,
     chat_history: list = [],
 ):
+    try:
+        SPARQL_BREAKERS.get(sparql_url).check(claim=False)
+    except CircuitOpenError:
+        yield {"status": "Knowledge graph is unavailable, skipping the agent."}
+        raise
     yield {"status": "Planning search strategy…"}
     yield {"status": "Streaming response…"}
     async for value in _make_agent_stream(sparql_url)(
@@ -0,0 +1,195 @@
+"""Canonical form of generated SPARQL queries.
+
+Two runs of the query translator rarely produce byte-identical queries
+for the same question: whitespace, keyword case, PREFIX order, unused
+prefixes, variable names and quoting all vary.  :func:`canonicalize`
+rewrites a query into a stable form that is identical for all such
+variants, for use as a cache key and for de-duplication.  The canonical
+query is itself valid SPARQL."""
+
+import re
+from typing import NamedTuple
+
+_TOKEN = re.compile(
+    r"""
+    (?P<space>\s+)
+  | (?P<comment>\#[^\n]*)
+  | (?P<string>\"\"\"(?:[^"\\]|\\.|"(?!""))*\"\"\"
+      | '''(?:[^'\\]|\\.|'(?!''))*'''
+      | "(?:[^"\\\n]|\\.)*"
+      | '(?:[^'\\\n]|\\.)*')
+  | (?P<iri><[^<>"{}|^`\\\s]*>)
+  | (?P<var>[?$][A-Za-z0-9_\u00b7-\uffff]+)
+  | (?P<bnode>_:[\w-]+(?:\.[\w-]+)*)
+  | (?P<pname>(?:[A-Za-z][\w-]*(?:\.[\w-]+)*)?:(?:[\w%:-]+(?:\.[\w%:-]+)*)?)
+  | (?P<langtag>@[A-Za-z]+(?:-[A-Za-z0-9]+)*)
+  | (?P<number>(?:\d+\.\d+|\.\d+|\d+)(?:[eE][+-]?\d+)?)
+  | (?P<word>[A-Za-z_]\w*)
+  | (?P<punct>\^\^|&&|\|\||!=|<=|>=|[{}()\[\].,;*=<>!?+\-/|^])
+    """,
+    re.VERBOSE,
+)
+
+
+class CanonicalQuery(NamedTuple):
+    text: str
+    # Original variable name (without ? or $) -> canonical name
+    variables: dict[str, str]
+
+
+# Tokens after which "<" can be a comparison rather than the start of an IRI
+_OPERANDS = frozenset(("var", "number", "string", "langtag"))
+_LESS_THAN = re.compile(r"<=?")
+
+
+def _is_comparison(match: re.Match, tokens: list[tuple[str, str]]) -> bool:
+    """Whether an ``iri`` *match* such as ``<5&&?y>`` (in ``?x<5&&?y>2``)
+    is really a comparison: it follows an operand and holds a variable or
+    ``&&`` but no scheme."""
+    if not tokens or not (tokens[-1][0] in _OPERANDS or tokens[-1][1] == ")"):
+        return False
+    content = match.group()[1:-1]
+    return any(c in content for c in "?$&") and "://" not in content
+
+
+def _tokenize(query: str) -> list[tuple[str, str]]:
+    tokens, position = [], 0
+    while position < len(query):
+        match = _TOKEN.match(query, position)
+        if match is None:
+            raise ValueError(f"Cannot tokenize SPARQL near {query[position:][:20]!r}")
+        if match.lastgroup == "iri" and _is_comparison(match, tokens):
+            match = _LESS_THAN.match(query, position)
+            tokens.append(("punct", match.group()))
+            position = match.end()
+            continue
+        if match.lastgroup not in ("space", "comment"):
+            tokens.append((match.lastgroup, match.group()))
+        position = match.end()
+    return tokens
+
+
+_STRING_ESCAPES = {"\\'": "'", '"': '\\"', "\n": "\\n", "\r": "\\r"}
+_STRING_ESCAPE = re.compile(r'\\.|["\n\r]')
+
+
+def _string(token: str) -> str:
+    """*token* as a single-line, double-quoted string literal."""
+    quotes = 3 if token.startswith(('"""', "'''")) else 1
+    body = _STRING_ESCAPE.sub(
+        lambda m: _STRING_ESCAPES.get(m.group(), m.group()), token[quotes:-quotes]
+    )
+    return f'"{body}"'
+
+
+def _number(token: str) -> str:
+    return str(int(token)) if token.isdigit() else token.lower()
+
+
+def canonicalize(query: str, default_graph: str | None = None) -> CanonicalQuery:
+    """Canonical form of *query*:
+
+    - comments and insignificant whitespace are dropped and keywords
+      upper-cased;
+    - PREFIX declarations that are used are sorted, unused ones dropped;
+    - variables and blank nodes are renamed by order of first use;
+    - string literals use double quotes, language tags are lower-cased
+      and integers lose leading zeros;
+    - LIMIT comes before OFFSET, and ``OFFSET 0`` is dropped;
+    - ``FROM <default_graph>`` is dropped when *default_graph* is given.
+
+    Raises ValueError for text that does not tokenize as SPARQL."""
+    tokens = _tokenize(query)
+    prefixes: dict[str, str] = {}
+    body: list[tuple[str, str]] = []
+    i = 0
+    while i < len(tokens):
+        kind, value = tokens[i]
+        keyword = value.upper() if kind == "word" else None
+        following = tokens[i + 1 : i + 3]
+        if keyword == "PREFIX" and [k for k, _ in following] == ["pname", "iri"]:
+            prefixes[following[0][1]] = following[1][1]
+            i += 3
+        elif (
+            keyword == "FROM"
+            and default_graph is not None
+            and following[:1] == [("iri", f"<{default_graph}>")]
+        ):
+            i += 2
+        else:
+            body.append((kind, value))
+            i += 1
+
+    variables: dict[str, str] = {}
+    bnodes: dict[str, str] = {}
+    used_prefixes: set[str] = set()
+    out: list[str] = []
+    i = 0
+    while i < len(body):
+        kind, value = body[i]
+        # Consecutive LIMIT/OFFSET clauses, in canonical order
+        modifiers = {}
+        while (
+            i + 1 < len(body)
+            and body[i][0] == "word"
+            and body[i][1].upper() in ("LIMIT", "OFFSET")
+            and body[i + 1][0] == "number"
+        ):
+            modifiers[body[i][1].upper()] = _number(body[i + 1][1])
+            i += 2
+        if modifiers:
+            if "LIMIT" in modifiers:
+                out += ["LIMIT", modifiers["LIMIT"]]
+            if modifiers.get("OFFSET", "0") != "0":
+                out += ["OFFSET", modifiers["OFFSET"]]
+            continue
+
+        if kind == "var":
+            token = "?" + variables.setdefault(value[1:], f"v{len(variables)}")
+        elif kind == "bnode":
+            token = "_:" + bnodes.setdefault(value, f"b{len(bnodes)}")
+        elif kind == "word":
+            # "a" and the boolean literals are case-sensitive
+            token = value if value in ("a", "true", "false") else value.upper()
+        elif kind == "string":
+            token = _string(value)
+        elif kind == "number":
+            token = _number(value)
+        elif kind == "langtag":
+            token = value.lower()
+        else:
+            token = value
+        if kind == "pname":
+            used_prefixes.add(value.split(":", 1)[0] + ":")
+        # Language tags and datatypes stay attached to their literal
+        if out and (kind == "langtag" or value == "^^" or out[-1].endswith("^^")):
+            out[-1] += token
+        else:
+            out.append(token)
+        i += 1
+
+    header = [
+        f"PREFIX {prefix} {prefixes[prefix]}"
+        for prefix in sorted(used_prefixes)
+        if prefix in prefixes
+    ]
+    return CanonicalQuery("\n".join(header + [" ".join(out)]), variables)
+
+
+def rename_variables(result: dict, mapping: dict[str, str]) -> dict:
+    """*result* (SPARQL JSON results) with variables renamed by *mapping*;
+    names not in it are kept."""
+    if "head" not in result:
+        return result
+    renamed = dict(result)
+    head = dict(result["head"])
+    if "vars" in head:
+        head["vars"] = [mapping.get(name, name) for name in head["vars"]]
+    renamed["head"] = head
+    if "results" in result:
+        renamed["results"] = dict(result["results"])
+        renamed["results"]["bindings"] = [
+            {mapping.get(name, name): value for name, value in binding.items()}
+            for binding in result["results"].get("bindings", [])
+        ]
+    return renamed
@@ -7,6 +7,9 @@ from gnais.search.tools import route_model
 class Classification(dspy.Signature):
     input_text: str = dspy.InputField()
     decision: str = dspy.OutputField(desc='"keyword" or "semantic"')
+    entity_types: list[str] = dspy.OutputField(
+        desc="entity types the query is about, from the listed types; empty if unsure"
+    )
 
 
 class Extraction(dspy.Signature):
@@ -34,14 +37,16 @@ Produce a list of space separated keywords featured in the query below. Only ret
 
 
 @lru_cache(maxsize=2048)
-def classify_search(query: str) -> str:
+def classify_search(query: str, entity_types: tuple[str, ...] = ()) -> str:
     """Classify user query as keyword search or semantic search
 
     Args:
         query: user query
+        entity_types: corpus entity types the query may be narrowed to
 
     Returns:
-        type of search for query processing
+        type of search for query processing, and the entity types the
+        query is about
     """
     return route_model()(dspy.Predict(Classification))(
         input_text=f"""
@@ -49,7 +54,8 @@ You are an experienced search classifier.
 You can accurately tell from a query if a keyword search or semantic search is more appropriate to provide satisfactory answers to the user.
 A keyword search is appropriate when specific entities feature in the query (i.e trait id, marker code, etc.).
 A semantic search is better when the system needs to understand the meaning of the query and make implicit connections.
-Infer the type of search that should be performed given the query below:
+Infer the type of search that should be performed given the query below.
+Also list which of these entity types the query is about (leave it empty when the query is broad or you are unsure): {", ".join(entity_types) or "none"}
 
 {query}
 """
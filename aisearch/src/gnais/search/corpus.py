@@ -1,103 +1,1584 @@
+import asyncio
+import concurrent.futures
+import hashlib
 import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
 import warnings
-from functools import lru_cache
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, deque
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Any
-
-import chromadb
-import torch
-from langchain_classic.retrievers import EnsembleRetriever
-from langchain_community.retrievers import BM25Retriever
-from langchain_community.vectorstores import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, Sequence
+
+import numpy as np
+import scipy.sparse as sp
+from gnais.search.embeddings import (
+    BatchedEmbeddings,
+    CachedEmbeddings,
+    RemoteEmbeddings,
+    ShardedEmbedder,
+    SharedEmbeddings,
+    chunked,
+    iter_embeddings,
+)
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
 from tqdm import tqdm
 
+# torch, chromadb, sentence-transformers and the langchain integrations
+# take seconds to import; they are imported by the functions that use
+# them, so importing this module (and gnais.search) stays cheap
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import Chroma
+
 warnings.filterwarnings("ignore")
 
+logger = logging.getLogger(__name__)
 
-def get_docs(corpus_dir: str) -> dict:
-    corpus_dir = Path(corpus_dir)
-    metadata = []
-    for corpus in corpus_dir.iterdir():
+
+def _update_fingerprint(digest: Any, doc: str) -> None:
+    data = doc.encode("utf-8")
+    # Length-prefix each document so ["ab", "c"] and ["a", "bc"] differ
+    digest.update(len(data).to_bytes(8, "little"))
+    digest.update(data)
+
+
+def corpus_fingerprint(docs: Iterable[str]) -> str:
+    """Stable content hash of *docs*, computed in a single streaming pass."""
+    digest = hashlib.sha256()
+    for doc in docs:
+        _update_fingerprint(digest, doc)
+    return digest.hexdigest()
+
+
+class Corpus(Sequence):
+    """The corpus documents together with their content fingerprint.
+
+    Corpora hash and compare by fingerprint, so caches keyed on a corpus
+    cost O(1) per lookup and keep a reference to it instead of a copy.
+    *shards* maps each entity type (the corpus file it was read from, e.g.
+    ``gene``) to the ``[start, stop)`` row ranges of its documents.  A
+    corpus loaded from a document store records the *index_dir* (index
+    version) it belongs to, so that its other indexes are loaded from the
+    same build."""
+
+    def __init__(
+        self,
+        docs: Sequence[str],
+        fingerprint: str | None = None,
+        shards: dict[str, list[list[int]]] | None = None,
+        index_dir: Path | None = None,
+    ):
+        self.docs = docs
+        self.fingerprint = fingerprint or corpus_fingerprint(docs)
+        self.shards = shards or {}
+        self.index_dir = index_dir
+        self._shard_starts = sorted(
+            (start, stop, doc_type)
+            for doc_type, ranges in self.shards.items()
+            for start, stop in ranges
+        )
+
+    def doc_type(self, i: int) -> str | None:
+        """Entity type of document *i*, if the corpus has shards."""
+        pos = bisect_right(self._shard_starts, (i, float("inf"))) - 1
+        if pos >= 0 and i < self._shard_starts[pos][1]:
+            return self._shard_starts[pos][2]
+        return None
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def __getitem__(self, i):
+        return self.docs[i]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.docs)
+
+    def __hash__(self) -> int:
+        return hash(self.fingerprint)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Corpus) and other.fingerprint == self.fingerprint
+
+    def __repr__(self) -> str:
+        return f"Corpus({len(self)} docs, fingerprint={self.fingerprint[:12]})"
+
+
+def as_corpus(docs: Sequence[str]) -> Corpus:
+    return docs if isinstance(docs, Corpus) else Corpus(docs)
+
+
+_WHITESPACE = re.compile(r"\s*")
+_DELIMITERS = frozenset(" \t\r\n,]")
+
+
+def _iter_json_array(fp: Any, chunk_size: int = 1 << 20) -> Iterator[Any]:
+    """Yield the items of the top-level JSON array in *fp* one at a time,
+    so at most one read chunk plus one item is held in memory."""
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+    state = "open"  # then "first", and "next"/"item" between items
+    while True:
+        pos = _WHITESPACE.match(buf, pos).end()
+        if pos == len(buf):
+            if eof:
+                raise ValueError(f"Unexpected end of JSON array in {fp.name}")
+            chunk = fp.read(chunk_size)
+            buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+            continue
+        char = buf[pos]
+        if state == "open":
+            if char != "[":
+                raise ValueError(f"{fp.name} does not hold a JSON array")
+            pos, state = pos + 1, "first"
+        elif state in ("first", "next") and char == "]":
+            return
+        elif state == "next":
+            if char != ",":
+                raise ValueError(f"Malformed JSON array in {fp.name}")
+            pos, state = pos + 1, "item"
+        else:
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                end = None
+            # An item touching the end of the buffer may be truncated, and
+            # so may a number or literal that is not followed by a delimiter
+            # (raw_decode accepts "2" out of a split "2.5e3")
+            if end is None or (
+                not eof
+                and (
+                    end == len(buf)
+                    or (char not in '[{"' and buf[end] not in _DELIMITERS)
+                )
+            ):
+                if eof:
+                    raise ValueError(f"Malformed JSON array in {fp.name}")
+                chunk = fp.read(chunk_size)
+                buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+                continue
+            yield item
+            pos, state = end, "next"
+
+
+def iter_typed_docs(corpus_dir: str) -> Iterator[tuple[str, str]]:
+    """Stream ``(doc_type, doc)`` for every corpus file in *corpus_dir*.
+
+    fetch_metadata.py writes one file per RDF type, so the file stem
+    (``gene``, ``dna_marker``, ...) is the entity type.  Files may be JSON
+    arrays (``.json``) or JSON Lines (``.jsonl``); both are read
+    incrementally.  Files are read in name order so the corpus
+    fingerprint is stable."""
+    for corpus in sorted(Path(corpus_dir).iterdir()):
         with open(corpus, "r") as data:
-            metadata.extend(json.load(data))
-    return metadata
+            if corpus.suffix == ".jsonl":
+                docs = (json.loads(line) for line in data if line.strip())
+            else:
+                docs = _iter_json_array(data)
+            for doc in docs:
+                yield corpus.stem, doc
 
 
-def _docs_to_tuple(docs: list) -> tuple:
-    """Convert docs list to a hashable tuple for caching."""
-    if not docs:
-        return tuple()
-    if isinstance(docs[0], str):
-        return tuple(docs)
-    return tuple(json.dumps(d, sort_keys=True) for d in docs)
+def iter_docs(corpus_dir: str) -> Iterator[str]:
+    """Stream the documents of every corpus file in *corpus_dir*."""
+    return (doc for _, doc in iter_typed_docs(corpus_dir))
 
 
-@lru_cache(maxsize=4)
-def get_embed_model(model_name: str):
+def _add_to_shard(shards: dict[str, list[list[int]]], doc_type: str, i: int) -> None:
+    ranges = shards.setdefault(doc_type, [])
+    if ranges and ranges[-1][1] == i:
+        ranges[-1][1] = i + 1
+    else:
+        ranges.append([i, i + 1])
+
+
+def get_docs(corpus_dir: str) -> Corpus:
+    """Load every corpus file in *corpus_dir*, hashing documents as they
+    are read."""
+    metadata = []
+    shards: dict[str, list[list[int]]] = {}
+    digest = hashlib.sha256()
+    for doc_type, doc in iter_typed_docs(corpus_dir):
+        _update_fingerprint(digest, doc)
+        _add_to_shard(shards, doc_type, len(metadata))
+        metadata.append(doc)
+    return Corpus(metadata, fingerprint=digest.hexdigest(), shards=shards)
+
+
+def get_embed_model(
+    model_name: str,
+    dimension: int | None = None,
+    cache_path: str | None = None,
+    batch_queries: bool = False,
+    num_threads: int | None = None,
+    server: str | None = None,
+):
     """Load (and cache) the embedding model so it is only instantiated once.
 
     Automatically uses CUDA when a GPU is available, otherwise falls back to
-    CPU.  (sentence-transformers does not accept torch_dtype.)"""
+    CPU.  (sentence-transformers does not accept torch_dtype.)  With
+    *dimension* set, Matryoshka embeddings are truncated to their first
+    *dimension* components and re-normalized.  With *cache_path* set, the
+    model is wrapped in :class:`CachedEmbeddings` backed by that file.
+    *batch_queries* routes query embeddings through a shared
+    :class:`BatchedEmbeddings` worker.  *num_threads* caps torch's
+    intra-op thread pool when the batched model is first loaded; that
+    setting is process-wide, not specific to the batcher.  With *server*
+    set (see ``scripts/embed_server.py``), no model is loaded: embeddings
+    come from that server, which batches the queries of every worker."""
+    # Cached on the full positional argument list, so keyword and
+    # positional callers get the same instance
+    return _embed_model(
+        model_name, dimension, cache_path, batch_queries, num_threads, server
+    )
+
+
+@lru_cache(maxsize=8)
+def _embed_model(
+    model_name: str,
+    dimension: int | None,
+    cache_path: str | None,
+    batch_queries: bool,
+    num_threads: int | None,
+    server: str | None,
+):
+    if cache_path is not None:
+        return CachedEmbeddings(
+            _embed_model(
+                model_name, dimension, None, batch_queries, num_threads, server
+            ),
+            namespace=f"{model_name}@{dimension or 'full'}",
+            path=cache_path,
+        )
+    if server is not None:
+        return RemoteEmbeddings(server, model_name, dimension)
+    if batch_queries:
+        if num_threads:
+            import torch
+
+            # Applies to every torch op of this process
+            torch.set_num_threads(num_threads)
+        # The unbatched model's cache key, so batched and unbatched callers
+        # share one loaded model
+        return BatchedEmbeddings(
+            _embed_model(model_name, dimension, None, False, None, None)
+        )
+    import torch
+    from langchain_huggingface import HuggingFaceEmbeddings
+
     device = "cuda" if torch.cuda.is_available() else "cpu"
+    model_kwargs = {"trust_remote_code": True, "device": device}
+    encode_kwargs = {"batch_size": 1024}
+    if dimension is not None:
+        model_kwargs["truncate_dim"] = dimension
+        encode_kwargs["normalize_embeddings"] = True
     return HuggingFaceEmbeddings(
         model_name=model_name,
-        model_kwargs={"trust_remote_code": True, "device": device},
-        encode_kwargs={"batch_size": 1024},
+        model_kwargs=model_kwargs,
+        encode_kwargs=encode_kwargs,
     )
 
 
-@lru_cache(maxsize=2048)
-def _cached_bm25_retriever(docs_tuple: tuple, k: int):
-    """Build (and cache) the BM25 retriever.  Tokenizing the corpus is
-    expensive, so we only do it once per unique (docs, k) pair."""
-    return BM25Retriever.from_texts(
-        texts=list(docs_tuple),
-        metadatas=[{"source": f"Document {ind + 1}"} for ind in range(len(docs_tuple))],
-        k=k,
+def memory_embedder(
+    model_name: str,
+    dimension: int | None = None,
+    cache_path: str | None = None,
+    num_threads: int | None = None,
+    server: str | None = None,
+) -> dict:
+    """mem0 ``embedder`` config backed by :func:`get_embed_model`.
+
+    mem0's ``langchain`` provider accepts any langchain ``Embeddings``, so
+    memory embeds with the same (query-batched) model instance as
+    retrieval instead of loading a second copy.  Pass the arguments the
+    retrievers use so both resolve to the same cached model."""
+    return {
+        "provider": "langchain",
+        "config": {
+            "model": SharedEmbeddings(
+                partial(
+                    get_embed_model,
+                    model_name,
+                    dimension,
+                    cache_path,
+                    True,
+                    num_threads,
+                    server,
+                )
+            ),
+            "embedding_dims": dimension or 1024,
+        },
+    }
+
+
+def _tokenize(text: str) -> list[str]:
+    """Split text the same way langchain's BM25Retriever does by default."""
+    return text.split()
+
+
+class _StringTable:
+    """Read-only sequence of strings stored as one UTF-8 blob plus an
+    offsets array.  Both files are memory-mapped, so every process that
+    opens the same table shares its pages."""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("string table index out of range")
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.blob[start:end].tobytes().decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        return (self[i] for i in range(len(self)))
+
+    @staticmethod
+    def write(strings: Iterable[str], path: Path, name: str) -> int:
+        offsets = array("q", [0])
+        with open(path / f"{name}.bin", "wb") as blob:
+            for string in strings:
+                data = string.encode("utf-8")
+                blob.write(data)
+                offsets.append(offsets[-1] + len(data))
+        np.save(path / f"{name}.offsets.npy", np.frombuffer(offsets, dtype=np.int64))
+        return len(offsets) - 1
+
+    @classmethod
+    def load(cls, path: Path, name: str) -> "_StringTable":
+        blob_path = path / f"{name}.bin"
+        # np.memmap refuses to map empty files
+        blob = (
+            np.memmap(blob_path, dtype=np.uint8, mode="r")
+            if blob_path.stat().st_size
+            else np.zeros(0, dtype=np.uint8)
+        )
+        return cls(blob, np.load(path / f"{name}.offsets.npy", mmap_mode="r"))
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the *k* best scores along the last axis, best first."""
+    k = min(k, scores.shape[-1])
+    if k <= 0:
+        return np.zeros(scores.shape[:-1] + (0,), dtype=np.int64)
+    top = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=-1), axis=-1)
+    return np.take_along_axis(top, order, axis=-1)
+
+
+def _make_tmp_dir(index_dir: Path) -> Path:
+    tmp_dir = index_dir.with_name(f"{index_dir.name}.tmp")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+    return tmp_dir
+
+
+def _replace_dir(tmp_dir: Path, index_dir: Path) -> None:
+    """Move a freshly written index directory into place.  Processes
+    that still map the old files keep reading them until they reload.
+
+    Replacing an existing directory is not atomic; indexes that are being
+    served are written to a new version instead (see
+    :func:`new_index_version`)."""
+    if index_dir.exists():
+        old_dir = index_dir.with_name(f"{index_dir.name}.old")
+        if old_dir.exists():
+            shutil.rmtree(old_dir)
+        index_dir.rename(old_dir)
+        tmp_dir.rename(index_dir)
+        shutil.rmtree(old_dir)
+    else:
+        tmp_dir.rename(index_dir)
+
+
+def index_root(index_path: str) -> Path:
+    """Directory of the current index set under *index_path*: the version
+    that ``current`` links to, or *index_path* itself for indexes written
+    directly into it."""
+    current = Path(index_path) / "current"
+    return current.resolve() if current.exists() else Path(index_path)
+
+
+def new_index_version(index_path: str) -> Path:
+    """A new, empty directory under ``<index_path>/versions`` to build a
+    complete index set in, before :func:`publish_index_version`."""
+    versions = Path(index_path) / "versions"
+    versions.mkdir(parents=True, exist_ok=True)
+    # Timestamped names sort in build order
+    prefix = time.strftime("%Y%m%d-%H%M%S-")
+    return Path(tempfile.mkdtemp(prefix=prefix, dir=versions))
+
+
+def publish_index_version(index_path: str, version: Path, keep: int = 2) -> None:
+    """Make *version* the current index set by atomically re-pointing the
+    ``current`` symlink, so readers see either the old set or the new one,
+    never a mix.  Only the *keep* newest versions are kept; processes that
+    mapped files of a deleted version keep reading them until they
+    reload."""
+    index_path = Path(index_path)
+    # The version being replaced is kept even if newer, unpublished
+    # versions (from failed builds) exist
+    live = {version.resolve(), index_root(index_path).resolve()}
+    link = index_path / "current.tmp"
+    link.unlink(missing_ok=True)
+    link.symlink_to(version.resolve().relative_to(index_path.resolve()))
+    os.replace(link, index_path / "current")
+    versions = sorted((index_path / "versions").iterdir())
+    for old in versions[:-keep]:
+        if old.resolve() not in live:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def build_doc_store(
+    docs: Iterable[str] | Iterable[tuple[str, str]], store_dir: str
+) -> Corpus:
+    """Write *docs* (consumed as a stream) to a compact document store: one
+    contiguous UTF-8 blob plus an offsets array.  Given ``(doc_type, doc)``
+    pairs (see :func:`iter_typed_docs`), the type shards are recorded too."""
+    store_dir = Path(store_dir)
+    tmp_dir = _make_tmp_dir(store_dir)
+    digest = hashlib.sha256()
+    shards: dict[str, list[list[int]]] = {}
+
+    def _hashed(docs: Iterable) -> Iterator[str]:
+        for i, doc in enumerate(docs):
+            if isinstance(doc, tuple):
+                doc_type, doc = doc
+                _add_to_shard(shards, doc_type, i)
+            _update_fingerprint(digest, doc)
+            yield doc
+
+    n_docs = _StringTable.write(_hashed(docs), tmp_dir, "docs")
+    meta = {"fingerprint": digest.hexdigest(), "n_docs": n_docs, "shards": shards}
+    (tmp_dir / "meta.json").write_text(json.dumps(meta, indent=2))
+    _replace_dir(tmp_dir, store_dir)
+    return load_doc_store(str(store_dir))
+
+
+def load_doc_store(store_dir: str) -> Corpus:
+    """Memory-map a document store read-only.  Every process that loads
+    the same store shares its pages, and strings are only decoded for the
+    documents that are actually accessed."""
+    store_dir = Path(store_dir).resolve()
+    meta = json.loads((store_dir / "meta.json").read_text())
+    return Corpus(
+        _StringTable.load(store_dir, "docs"),
+        fingerprint=meta["fingerprint"],
+        shards=meta.get("shards"),
+        index_dir=store_dir.parent,
+    )
+
+
+def _warn_if_stale(store_dir: Path, corpus_path: str) -> None:
+    corpus_files = list(Path(corpus_path).glob("*")) if corpus_path else []
+    built = (store_dir / "meta.json").stat().st_mtime
+    if any(path.stat().st_mtime > built for path in corpus_files):
+        logger.warning(
+            "The document store in %s is older than the corpus in %s; "
+            "rebuild it with scripts/build_index.py",
+            store_dir,
+            corpus_path,
+        )
+
+
+@lru_cache(maxsize=4)
+def load_corpus(index_path: str, corpus_path: str | None = None) -> Corpus:
+    """Load (and cache) the corpus, preferring the document store of the
+    current index set in *index_path* and falling back to reading
+    *corpus_path*.  A store older than *corpus_path* is used, with a
+    warning."""
+    store_dir = index_root(index_path) / "docs"
+    if store_dir.exists():
+        _warn_if_stale(store_dir, corpus_path)
+        return load_doc_store(str(store_dir))
+    if corpus_path is None:
+        raise FileNotFoundError(
+            f"No document store in {index_path}; run scripts/build_index.py"
+        )
+    return get_docs(corpus_path)
+
+
+class BM25Index:
+    """Okapi BM25 inverted index (same scoring as rank-bm25's BM25Okapi).
+
+    Postings are stored term-major: the documents containing term ``t``
+    are ``indices[indptr[t]:indptr[t + 1]]`` with their term frequencies
+    in ``tfs`` and precomputed BM25 term weights in ``weights``.  Together
+    they form a CSR term-document matrix, so a batch of queries is scored
+    with one sparse product.  Terms are sorted so the vocabulary can be
+    binary searched straight from the memory-mapped string table."""
+
+    def __init__(
+        self,
+        vocab: Any,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        tfs: np.ndarray,
+        weights: np.ndarray,
+        doc_lens: np.ndarray,
+        idf: np.ndarray,
+        meta: dict,
+    ):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.indices = indices
+        self.tfs = tfs
+        self.weights = weights
+        self.doc_lens = doc_lens
+        self.idf = idf
+        self.meta = meta
+        # Wraps the (possibly memory-mapped) arrays without copying them
+        self.matrix = sp.csr_matrix(
+            (weights, indices, indptr), shape=(len(indptr) - 1, meta["n_docs"])
+        )
+
+    @property
+    def n_docs(self) -> int:
+        return self.meta["n_docs"]
+
+    def term_id(self, term: str) -> int | None:
+        i = bisect_left(self.vocab, term)
+        if i < len(self.vocab) and self.vocab[i] == term:
+            return i
+        return None
+
+    def get_batch_scores(
+        self, queries: list[list[str]], start: int = 0, stop: int | None = None
+    ) -> np.ndarray:
+        """Score documents ``start:stop`` (default: all) for each tokenized
+        query.
+
+        Only the matrix rows of terms that occur in the batch are touched,
+        so the cost follows the postings of the query terms rather than
+        the corpus size.  Repeated query tokens count repeatedly, as in
+        BM25Okapi.  IDF is always corpus-wide, so scores of a document
+        range match the full scores."""
+        rows, cols = [], []
+        columns: dict[int, int] = {}
+        for row, tokens in enumerate(queries):
+            for token in tokens:
+                term = self.term_id(token)
+                if term is not None:
+                    rows.append(row)
+                    cols.append(columns.setdefault(term, len(columns)))
+        counts = sp.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+            shape=(len(queries), len(columns)),
+        )
+        terms = np.fromiter(columns, dtype=np.int64, count=len(columns))
+        if not start and stop is None:
+            return (counts @ self.matrix[terms]).toarray()
+        return (counts @ self._postings(terms, start, stop)).toarray()
+
+    def _postings(self, terms: np.ndarray, start: int, stop: int | None) -> Any:
+        """Rows of *terms* restricted to documents ``start:stop``.  Each
+        term's documents are sorted, so only the postings inside the range
+        are gathered."""
+        stop = self.n_docs if stop is None else stop
+        ranges = []
+        for term in terms:
+            lo, hi = self.indptr[term], self.indptr[term + 1]
+            docs = self.indices[lo:hi]
+            ranges.append(
+                (lo + np.searchsorted(docs, start), lo + np.searchsorted(docs, stop))
+            )
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([hi - lo for lo, hi in ranges])
+        return sp.csr_matrix(
+            (
+                np.concatenate([self.weights[lo:hi] for lo, hi in ranges] or [[]]),
+                np.concatenate([self.indices[lo:hi] for lo, hi in ranges] or [[]])
+                - start,
+                indptr,
+            ),
+            shape=(len(terms), stop - start),
+        )
+
+    def get_scores(self, tokens: list[str]) -> np.ndarray:
+        return self.get_batch_scores([tokens])[0]
+
+    def top_k_batch(
+        self, queries: list[list[str]], k: int, start: int = 0, stop: int | None = None
+    ) -> list[list[int]]:
+        """Best *k* document ids per query (within ``start:stop``), highest
+        score first."""
+        return (_top_k(self.get_batch_scores(queries, start, stop), k) + start).tolist()
+
+    def top_k(
+        self, tokens: list[str], k: int, start: int = 0, stop: int | None = None
+    ) -> list[int]:
+        return self.top_k_batch([tokens], k, start, stop)[0]
+
+    def save(self, index_dir: str) -> None:
+        index_dir = Path(index_dir)
+        tmp_dir = _make_tmp_dir(index_dir)
+        _StringTable.write(self.vocab, tmp_dir, "vocab")
+        for name in ("indptr", "indices", "tfs", "weights", "doc_lens", "idf"):
+            np.save(tmp_dir / f"{name}.npy", getattr(self, name))
+        (tmp_dir / "meta.json").write_text(json.dumps(self.meta, indent=2))
+        _replace_dir(tmp_dir, index_dir)
+
+    @classmethod
+    def load(cls, index_dir: str) -> "BM25Index":
+        index_dir = Path(index_dir)
+        arrays = {
+            name: np.load(index_dir / f"{name}.npy", mmap_mode="r")
+            for name in ("indptr", "indices", "tfs", "weights", "doc_lens", "idf")
+        }
+        return cls(
+            vocab=_StringTable.load(index_dir, "vocab"),
+            meta=json.loads((index_dir / "meta.json").read_text()),
+            **arrays,
+        )
+
+
+def build_bm25_index(
+    docs: Iterable[str], k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25
+) -> BM25Index:
+    """Tokenize *docs* once and build a :class:`BM25Index` in memory.
+
+    *docs* is consumed as a stream (e.g. from :func:`iter_docs`); only the
+    integer postings are kept, never the document texts."""
+    vocab: dict[str, int] = {}
+    post_terms, post_docs, post_tfs = array("i"), array("i"), array("i")
+    doc_lens = array("i")
+    digest = hashlib.sha256()
+    for doc_id, doc in enumerate(docs):
+        _update_fingerprint(digest, doc)
+        tokens = _tokenize(doc)
+        doc_lens.append(len(tokens))
+        for token, tf in Counter(tokens).items():
+            post_terms.append(vocab.setdefault(token, len(vocab)))
+            post_docs.append(doc_id)
+            post_tfs.append(tf)
+
+    # Renumber terms in sorted order, then group postings term by term
+    terms = sorted(vocab)
+    remap = np.empty(len(terms), dtype=np.int32)
+    remap[[vocab[term] for term in terms]] = np.arange(len(terms), dtype=np.int32)
+    post_terms = remap[np.frombuffer(post_terms, dtype=np.int32)]
+    order = np.argsort(post_terms, kind="stable")
+    post_terms = post_terms[order]
+    indices = np.frombuffer(post_docs, dtype=np.int32)[order]
+    tfs = np.frombuffer(post_tfs, dtype=np.int32)[order]
+    df = np.bincount(post_terms, minlength=len(terms))
+    # int32 throughout so scipy can wrap the arrays without casting them
+    indptr = np.zeros(len(terms) + 1, dtype=np.int32)
+    np.cumsum(df, out=indptr[1:])
+
+    n_docs = len(doc_lens)
+    doc_lens = np.frombuffer(doc_lens, dtype=np.int32)
+    avgdl = float(doc_lens.mean()) if n_docs else 0.0
+    idf = np.log(n_docs - df + 0.5) - np.log(df + 0.5)
+    # Same floor as BM25Okapi for terms found in more than half the docs
+    average_idf = idf.mean() if len(idf) else 0.0
+    idf[idf < 0] = epsilon * average_idf
+    norm = k1 * (1 - b + b * doc_lens[indices] / avgdl) if n_docs else 0.0
+    weights = (idf[post_terms] * tfs * (k1 + 1) / (tfs + norm)).astype(np.float32)
+
+    return BM25Index(
+        vocab=terms,
+        indptr=indptr,
+        indices=indices,
+        tfs=tfs,
+        weights=weights,
+        doc_lens=doc_lens,
+        idf=idf,
+        meta={
+            "fingerprint": digest.hexdigest(),
+            "n_docs": n_docs,
+            "avgdl": avgdl,
+            "k1": k1,
+            "b": b,
+            "epsilon": epsilon,
+        },
+    )
+
+
+@lru_cache(maxsize=4)
+def load_bm25_index(index_dir: str) -> BM25Index:
+    """Memory-map (and cache) a BM25 index written by ``BM25Index.save``."""
+    return BM25Index.load(index_dir)
+
+
+@lru_cache(maxsize=4)
+def _cached_bm25_index(corpus: Corpus) -> BM25Index:
+    """Build (and cache) an in-memory BM25 index when no prebuilt one is
+    available.  Tokenizing the corpus is expensive, so we only do it once
+    per corpus fingerprint."""
+    return build_bm25_index(corpus)
+
+
+# Sentence openings (see TEMPLATES in scripts/fetch_metadata.py) whose
+# object names the subject: labels, symbols, codes and identifiers
+_IDENTIFIER_PHRASES = (
+    "is called",
+    "is also known as",
+    "is labeled as",
+    "has identifier",
+    "has notation",
+    "has short name",
+    "has alias",
+    "has abbreviation",
+    "has lab code",
+    "has gene symbol",
+    "has gene ID",
+    "has target id",
+    "has locus",
+    "provides a unique identifier code for a resource set",
+)
+_KEY_PUNCTUATION = "\"'()[]{},;:?!."
+# Longest label, in words, that queries are matched against
+_MAX_KEY_WORDS = 8
+
+
+def _normalize_key(text: str) -> str:
+    words = (word.strip(_KEY_PUNCTUATION) for word in text.casefold().split())
+    return " ".join(word for word in words if word)
+
+
+def document_identifiers(doc: str) -> set[str]:
+    """Normalized exact-match keys of *doc*: its subject IRI (prefixed and
+    local name) and the values of its label and identifier sentences."""
+    subject = document_subject(doc)
+    keys = {subject.casefold(), subject.split(":", 1)[-1].casefold()}
+    # Every sentence of a document starts with its subject
+    for sentence in doc.removesuffix(".").split(f". {subject} "):
+        sentence = sentence.removeprefix(f"{subject} ")
+        for phrase in _IDENTIFIER_PHRASES:
+            if sentence.startswith(f"{phrase} "):
+                value = sentence[len(phrase) + 1 :].strip("'")
+                # Identifiers can themselves be IRIs (gn:..., with colons)
+                keys.add(value.casefold())
+                keys.add(_normalize_key(value))
+                break
+    return {key for key in keys if key}
+
+
+class EntityIndex:
+    """Exact-match index from identifiers, symbols and labels to documents.
+
+    Like the BM25 vocabulary, the keys are a sorted memory-mapped string
+    table (looked up by binary search) with the matching document ids in
+    CSR form: ``doc_ids[indptr[i]:indptr[i + 1]]`` for key ``i``."""
+
+    def __init__(self, keys: Any, indptr: np.ndarray, doc_ids: np.ndarray, meta: dict):
+        self.keys = keys
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.meta = meta
+
+    def lookup(self, key: str) -> list[int]:
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return self.doc_ids[self.indptr[i] : self.indptr[i + 1]].tolist()
+        return []
+
+    def search(self, query: str) -> list[int]:
+        """Documents named by an identifier or label in *query*, longest
+        matches first.  Keys of one or two characters only match when the
+        query writes them with a capital or a digit."""
+        original = query.split()
+        words = query.casefold().split()
+        hits: dict[int, None] = {}
+        matched: set[int] = set()
+        for n in range(min(_MAX_KEY_WORDS, len(words)), 0, -1):
+            for start in range(len(words) - n + 1):
+                span = set(range(start, start + n))
+                if span & matched:
+                    continue
+                phrase = " ".join(words[start : start + n])
+                key = phrase.strip(_KEY_PUNCTUATION)
+                if len(key) <= 2 and original[start].strip(_KEY_PUNCTUATION).islower():
+                    # "in", "of", ...: only a short symbol written as one
+                    # ("C3", "Gh") is taken as an identifier
+                    continue
+                doc_ids = self.lookup(key) or self.lookup(_normalize_key(phrase))
+                if doc_ids:
+                    matched |= span
+                    hits.update(dict.fromkeys(doc_ids))
+        return list(hits)
+
+    def save(self, index_dir: str) -> None:
+        index_dir = Path(index_dir)
+        tmp_dir = _make_tmp_dir(index_dir)
+        _StringTable.write(self.keys, tmp_dir, "keys")
+        np.save(tmp_dir / "indptr.npy", self.indptr)
+        np.save(tmp_dir / "doc_ids.npy", self.doc_ids)
+        (tmp_dir / "meta.json").write_text(json.dumps(self.meta, indent=2))
+        _replace_dir(tmp_dir, index_dir)
+
+    @classmethod
+    def load(cls, index_dir: str) -> "EntityIndex":
+        index_dir = Path(index_dir)
+        return cls(
+            keys=_StringTable.load(index_dir, "keys"),
+            indptr=np.load(index_dir / "indptr.npy", mmap_mode="r"),
+            doc_ids=np.load(index_dir / "doc_ids.npy", mmap_mode="r"),
+            meta=json.loads((index_dir / "meta.json").read_text()),
+        )
+
+
+def build_entity_index(docs: Iterable[str]) -> EntityIndex:
+    """Collect the :func:`document_identifiers` of *docs* (consumed as a
+    stream) into an :class:`EntityIndex`."""
+    postings: dict[str, array] = {}
+    digest = hashlib.sha256()
+    n_docs = 0
+    for doc_id, doc in enumerate(docs):
+        _update_fingerprint(digest, doc)
+        for key in document_identifiers(doc):
+            postings.setdefault(key, array("i")).append(doc_id)
+        n_docs += 1
+    keys = sorted(postings)
+    indptr = np.zeros(len(keys) + 1, dtype=np.int64)
+    np.cumsum([len(postings[key]) for key in keys], out=indptr[1:])
+    doc_ids = np.fromiter(
+        (doc_id for key in keys for doc_id in postings[key]),
+        dtype=np.int32,
+        count=int(indptr[-1]),
+    )
+    meta = {"fingerprint": digest.hexdigest(), "n_docs": n_docs, "n_keys": len(keys)}
+    return EntityIndex(keys, indptr, doc_ids, meta)
+
+
+@lru_cache(maxsize=4)
+def load_entity_index(index_dir: str) -> EntityIndex:
+    """Memory-map (and cache) an index written by ``EntityIndex.save``."""
+    return EntityIndex.load(index_dir)
+
+
+@lru_cache(maxsize=4)
+def _cached_entity_index(corpus: Corpus) -> EntityIndex:
+    return build_entity_index(corpus)
+
+
+class BM25IndexRetriever(BaseRetriever):
+    """Native BM25 retriever over a :class:`BM25Index`.
+
+    Drop-in replacement for langchain's ``BM25Retriever``: it returns the
+    same documents, but scores with sparse matrix products instead of a
+    Python loop over the corpus, and ``batch`` scores all queries at once.
+    Documents are referenced by integer id; strings are only materialized
+    from *docs* (usually the memory-mapped document store) for the hits.
+    """
+
+    index: Any
+    docs: Any
+    k: int = 4
+
+    def _to_documents(self, doc_ids: list[int]) -> list[Document]:
+        return [
+            Document(
+                page_content=self.docs[i],
+                metadata=_document_metadata(
+                    self.docs[i], _doc_type(self.docs, i), source=f"Document {i + 1}"
+                ),
+            )
+            for i in doc_ids
+        ]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        return self._to_documents(self.index.top_k(_tokenize(query), self.k))
+
+    def batch(self, inputs: list[str], config: Any = None, **kwargs) -> list:
+        hits = self.index.top_k_batch([_tokenize(query) for query in inputs], self.k)
+        return [self._to_documents(doc_ids) for doc_ids in hits]
+
+
+def document_subject(doc: str) -> str:
+    """Subject of a corpus document.  Every sentence in a document starts
+    with the (prefixed) IRI of the entity it describes."""
+    return doc.split(" ", 1)[0]
+
+
+def _doc_type(docs: Sequence[str], i: int) -> str | None:
+    return docs.doc_type(i) if isinstance(docs, Corpus) else None
+
+
+def _document_metadata(
+    doc: str, doc_type: str | None, source: str | None = None
+) -> dict:
+    """Subject IRI and entity type (when known) of *doc*.  *source*
+    defaults to the subject."""
+    subject = document_subject(doc)
+    metadata = {"source": source or subject, "subject": subject}
+    if doc_type is not None:
+        metadata["type"] = doc_type
+    return metadata
+
+
+def document_id(doc: str) -> str:
+    """Stable vector store id: the subject plus a hash of the content, so
+    an unchanged document always maps to the same id and an edited one
+    to a new id."""
+    content_hash = hashlib.sha256(doc.encode("utf-8")).hexdigest()[:16]
+    return f"{document_subject(doc)}#{content_hash}"
+
+
+def _stored_metadata(db: Any, page_size: int = 10_000) -> dict[str, dict]:
+    """Id -> metadata of every document in the collection."""
+    stored: dict[str, dict] = {}
+    offset = 0
+    while True:
+        page = db.get(include=["metadatas"], limit=page_size, offset=offset)
+        stored.update(zip(page["ids"], (m or {} for m in page["metadatas"])))
+        if len(page["ids"]) < page_size:
+            return stored
+        offset += page_size
+
+
+def _add_chunk(
+    db: Any, chunk: list[tuple[str, str, dict]], embeddings: np.ndarray | None = None
+) -> None:
+    if embeddings is not None:
+        # Already embedded by a ShardedEmbedder: write the vectors directly
+        db._collection.add(
+            ids=[doc_id for doc_id, _, _ in chunk],
+            embeddings=embeddings,
+            documents=[doc for _, doc, _ in chunk],
+            metadatas=[metadata for _, _, metadata in chunk],
+        )
+        return
+    db.add_texts(
+        texts=[doc for _, doc, _ in chunk],
+        metadatas=[metadata for _, _, metadata in chunk],
+        ids=[doc_id for doc_id, _, _ in chunk],
     )
 
 
+def _check_chroma_dimension(db: "Chroma", dimension: int | None) -> None:
+    """Reject a collection whose recorded embedding size is not *dimension*."""
+    stored = (db._collection.metadata or {}).get("embed_dim")
+    if dimension is not None and stored is not None and stored != dimension:
+        raise ValueError(
+            f"Chroma collection holds {stored}-dim embeddings but "
+            f"{dimension} were requested; rebuild it with "
+            "scripts/build_index.py --sync-chroma"
+        )
+
+
 def init_chroma_db(
-    docs: list,
+    docs: Iterable[str],
     embed_model: Any,
     chroma_host: str = "localhost",
     chroma_port: int = 8000,
     chunk_size: int = 1024,
+    dimension: int | None = None,
+    embed_cache: str | None = None,
+    workers: int = 0,
+    checkpoint_dir: str | None = None,
+    threads_per_worker: int | None = None,
 ):
+    """Sync the Chroma collection with *docs*.
+
+    Only documents whose id is not stored yet are embedded, and stored
+    documents that are no longer in the corpus are deleted, so re-running
+    this on an unchanged corpus embeds nothing.  With *workers* set, the
+    new documents are embedded by a :class:`ShardedEmbedder` that keeps its
+    per-shard checkpoints in *checkpoint_dir*.
+
+    Returns the collection and the counts of added, deleted, re-tagged and
+    unchanged documents (plus the embedding cache's hits and misses when
+    embedding in this process)."""
+    if workers and checkpoint_dir is None:
+        raise ValueError("A checkpoint_dir is required for parallel embedding")
+    import chromadb
+    from langchain_community.vectorstores import Chroma
+
     client = chromadb.HttpClient(host=chroma_host, port=chroma_port)
+    # Parallel syncs embed in the worker processes only
+    embedding = (
+        None if workers else get_embed_model(embed_model, dimension, embed_cache)
+    )
     db = Chroma(
         client=client,
-        embedding_function=get_embed_model(embed_model),
+        embedding_function=embedding,
+        collection_metadata={"embed_dim": dimension} if dimension else None,
     )
-    for i in tqdm(range(0, len(docs), chunk_size)):
-        chunk = docs[i : i + chunk_size]
-        metadatas = [
-            {"source": f"Document {ind + 1}"} for ind in range(i, i + len(chunk))
-        ]
-        db.add_texts(
-            texts=chunk,
-            metadatas=metadatas,
+    _check_chroma_dimension(db, dimension)
+    metadata = db._collection.metadata or {}
+    if dimension is not None and "embed_dim" not in metadata:
+        # Collections created before the dimension was recorded
+        db._collection.modify(
+            metadata={
+                **{k: v for k, v in metadata.items() if not k.startswith("hnsw:")},
+                "embed_dim": dimension,
+            }
         )
+    stored = _stored_metadata(db)
+    seen: set[str] = set()
+    # Documents stored before their type and subject were recorded
+    retagged: list[tuple[str, dict]] = []
+
+    def _new_documents() -> Iterator[tuple[str, str, dict]]:
+        for i, doc in enumerate(tqdm(docs)):
+            doc_id = document_id(doc)
+            if doc_id in seen:
+                continue
+            seen.add(doc_id)
+            metadata = _document_metadata(doc, _doc_type(docs, i))
+            if doc_id not in stored:
+                yield doc_id, doc, metadata
+            elif stored[doc_id] != metadata:
+                retagged.append((doc_id, metadata))
+
+    added = 0
+    if workers:
+        embedder = ShardedEmbedder(
+            partial(get_embed_model, embed_model, dimension, embed_cache),
+            namespace=f"{embed_model}@{dimension or 'full'}",
+            checkpoint_dir=checkpoint_dir,
+            workers=workers,
+            threads_per_worker=threads_per_worker,
+        )
+        # Documents handed to the embedder whose vectors are not back yet
+        in_flight: deque[tuple[str, str, dict]] = deque()
+
+        def _texts() -> Iterator[str]:
+            for item in _new_documents():
+                in_flight.append(item)
+                yield item[1]
+
+        for _, vectors in embedder.iter_embeddings(_texts()):
+            _add_chunk(db, [in_flight.popleft() for _ in vectors], vectors)
+            added += len(vectors)
+    else:
+        for chunk in chunked(_new_documents(), chunk_size):
+            _add_chunk(db, chunk)
+            added += len(chunk)
+
+    for i in range(0, len(retagged), chunk_size):
+        chunk = retagged[i : i + chunk_size]
+        db._collection.update(
+            ids=[doc_id for doc_id, _ in chunk],
+            metadatas=[metadata for _, metadata in chunk],
+        )
+
+    stale = list(stored.keys() - seen)
+    for i in range(0, len(stale), chunk_size):
+        db.delete(ids=stale[i : i + chunk_size])
+    stats = {
+        "added": added,
+        "deleted": len(stale),
+        "retagged": len(retagged),
+        "unchanged": len(seen) - added - len(retagged),
+    }
+    if isinstance(embedding, CachedEmbeddings):
+        stats["embedding_cache"] = dict(embedding.stats)
     # No db.persist() needed — the server handles persistence
-    return db
+    return db, stats
 
 
 def get_chroma_db(
     chroma_host: str = "localhost",
     chroma_port: int = 8000,
     embed_model: Any = None,
+    dimension: int | None = None,
+    embed_cache: str | None = None,
+    batch_queries: bool = False,
+    embed_threads: int | None = None,
+    embed_server: str | None = None,
 ):
+    import chromadb
+    from langchain_community.vectorstores import Chroma
+
     client = chromadb.HttpClient(host=chroma_host, port=chroma_port)
-    return Chroma(
+    db = Chroma(
         client=client,
-        embedding_function=get_embed_model(embed_model),
+        embedding_function=get_embed_model(
+            embed_model,
+            dimension,
+            embed_cache,
+            batch_queries,
+            embed_threads,
+            embed_server,
+        ),
+    )
+    _check_chroma_dimension(db, dimension)
+    return db
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _train_ivf(
+    vectors: np.ndarray, nlist: int, n_iter: int = 10, seed: int = 0
+) -> np.ndarray:
+    """Spherical k-means centroids trained on a sample of *vectors*."""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), nlist * 64)
+    rows = np.sort(rng.choice(len(vectors), size=sample_size, replace=False))
+    sample = vectors[rows].astype(np.float32)
+    centroids = sample[rng.choice(sample_size, size=nlist, replace=False)]
+    for _ in range(n_iter):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        counts = np.bincount(assignment, minlength=nlist)
+        # Empty clusters keep their previous centroid
+        sums[counts == 0] = centroids[counts == 0]
+        centroids = _normalize(sums)
+    return centroids
+
+
+def _assign_ivf(
+    vectors: np.ndarray, centroids: np.ndarray, block_size: int
+) -> np.ndarray:
+    assignment = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), block_size):
+        block = vectors[start : start + block_size].astype(np.float32)
+        assignment[start : start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignment
+
+
+def _quantize(vectors: np.ndarray, index_dir: Path, block_size: int) -> None:
+    """Write int8 (symmetric, per-dimension scale) and binary (sign bit)
+    copies of *vectors* for the first pass of quantized search."""
+    scale = np.zeros(vectors.shape[1], dtype=np.float32)
+    for start in range(0, len(vectors), block_size):
+        block = np.abs(vectors[start : start + block_size].astype(np.float32))
+        np.maximum(scale, block.max(axis=0), out=scale)
+    scale = np.maximum(scale, 1e-12) / 127
+    np.save(index_dir / "int8_scale.npy", scale)
+
+    int8 = np.lib.format.open_memmap(
+        index_dir / "int8.npy", mode="w+", dtype=np.int8, shape=vectors.shape
+    )
+    binary = np.lib.format.open_memmap(
+        index_dir / "binary.npy",
+        mode="w+",
+        dtype=np.uint8,
+        shape=(len(vectors), (vectors.shape[1] + 7) // 8),
+    )
+    for start in range(0, len(vectors), block_size):
+        block = vectors[start : start + block_size].astype(np.float32)
+        int8[start : start + len(block)] = np.round(block / scale)
+        binary[start : start + len(block)] = np.packbits(block > 0, axis=1)
+    int8.flush()
+    binary.flush()
+
+
+class LocalVectorStore(VectorStore):
+    """In-process vector index, an alternative to the Chroma HTTP server.
+
+    Row ``i`` of the memory-mapped float16 matrix is the unit-normalized
+    embedding of document ``i`` in *docs*, and ``ids[i]`` its stable id
+    (see :func:`document_id`).  ``search="exact"`` scores every row with
+    a blocked matrix product; ``search="ivf"`` only scores the rows in the
+    *nprobe* clusters whose centroids are closest to the query.
+
+    With ``quantization="int8"`` or ``"binary"`` the first pass runs over
+    the int8 (4x smaller than float32) or sign-bit (32x smaller) copy of
+    the matrix, and only the best ``k * rerank`` candidates are re-scored
+    exactly against the float16 rows.
+
+    Searches accept Chroma's ``filter={"type": ...}`` (a type or
+    ``{"$in": [...]}``) and then only score the rows of those type
+    shards."""
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        ids: Any,
+        docs: Sequence[str],
+        embedding: Embeddings,
+        meta: dict,
+        centroids: np.ndarray | None = None,
+        list_indptr: np.ndarray | None = None,
+        list_rows: np.ndarray | None = None,
+        quantized: dict[str, np.ndarray] | None = None,
+        search: str = "exact",
+        quantization: str = "none",
+        nprobe: int = 16,
+        rerank: int = 10,
+        block_size: int = 65_536,
+    ):
+        if search not in ("exact", "ivf"):
+            raise ValueError("search must be 'exact' or 'ivf'")
+        if search == "ivf" and centroids is None:
+            raise ValueError("This vector index was built without IVF clusters")
+        if quantization not in ("none", "int8", "binary"):
+            raise ValueError("quantization must be 'none', 'int8' or 'binary'")
+        if quantization != "none" and not quantized:
+            raise ValueError("This vector index was built without quantization")
+        self.vectors = vectors
+        self.ids = ids
+        self.docs = docs
+        self.embedding = embedding
+        self.meta = meta
+        self.centroids = centroids
+        self.list_indptr = list_indptr
+        self.list_rows = list_rows
+        self.quantized = quantized or {}
+        self.search = search
+        self.quantization = quantization
+        self.nprobe = nprobe
+        self.rerank = rerank
+        self.block_size = block_size
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def _candidate_rows(self, query: np.ndarray) -> np.ndarray | None:
+        if self.search == "exact":
+            return None
+        lists = _top_k(self.centroids @ query, self.nprobe)
+        rows = [
+            self.list_rows[self.list_indptr[i] : self.list_indptr[i + 1]] for i in lists
+        ]
+        # Sorted rows keep reads from the memory map sequential
+        return np.sort(np.concatenate(rows))
+
+    def _score(
+        self, matrix: np.ndarray, score_block: Any, rows: np.ndarray | None
+    ) -> np.ndarray:
+        """Apply *score_block* to *matrix* (restricted to *rows*) in blocks
+        so only one block is ever converted in memory."""
+        n_rows = len(matrix) if rows is None else len(rows)
+        scores = np.empty(n_rows, dtype=np.float32)
+        for start in range(0, n_rows, self.block_size):
+            stop = min(start + self.block_size, n_rows)
+            block = matrix[start:stop] if rows is None else matrix[rows[start:stop]]
+            scores[start:stop] = score_block(block)
+        return scores
+
+    def _approximate_scores(
+        self, query: np.ndarray, rows: np.ndarray | None
+    ) -> np.ndarray:
+        if self.quantization == "int8":
+            scaled = query * self.quantized["int8_scale"]
+            return self._score(
+                self.quantized["int8"],
+                lambda block: block.astype(np.float32) @ scaled,
+                rows,
+            )
+        bits = np.packbits(query > 0)
+        # Fewer differing sign bits means more similar
+        return self._score(
+            self.quantized["binary"],
+            lambda block: -np.bitwise_count(block ^ bits).sum(axis=1, dtype=np.int32),
+            rows,
+        )
+
+    def _filter_rows(self, filter: dict | None) -> np.ndarray | None:
+        if not filter:
+            return None
+        if set(filter) != {"type"}:
+            raise ValueError("LocalVectorStore can only filter on 'type'")
+        types = filter["type"]
+        types = types["$in"] if isinstance(types, dict) else [types]
+        ranges = sorted(
+            tuple(r) for doc_type in types for r in self.docs.shards.get(doc_type, [])
+        )
+        if not ranges:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate([np.arange(start, stop) for start, stop in ranges])
+
+    def _search_rows(
+        self, embedding: list[float], k: int, filter: dict | None = None
+    ) -> tuple:
+        query = _normalize(np.asarray(embedding, dtype=np.float32))
+        rows = self._candidate_rows(query)
+        allowed = self._filter_rows(filter)
+        if allowed is not None:
+            rows = (
+                allowed
+                if rows is None
+                else np.intersect1d(rows, allowed, assume_unique=True)
+            )
+        if self.quantization != "none":
+            shortlist = _top_k(self._approximate_scores(query, rows), k * self.rerank)
+            rows = np.sort(shortlist if rows is None else rows[shortlist])
+        scores = self._score(
+            self.vectors, lambda block: block.astype(np.float32) @ query, rows
+        )
+        top = _top_k(scores, k)
+        return (top if rows is None else rows[top]), scores[top]
+
+    def _to_document(self, row: int) -> Document:
+        doc = self.docs[row]
+        return Document(
+            id=self.ids[row],
+            page_content=doc,
+            metadata=_document_metadata(doc, _doc_type(self.docs, row)),
+        )
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: list[float],
+        k: int = 4,
+        filter: dict | None = None,
+        **kwargs: Any,
+    ) -> list[tuple[Document, float]]:
+        rows, scores = self._search_rows(embedding, k, filter)
+        return [
+            (self._to_document(row), float(score))
+            for row, score in zip(rows.tolist(), scores)
+        ]
+
+    def similarity_search_by_vector(
+        self,
+        embedding: list[float],
+        k: int = 4,
+        filter: dict | None = None,
+        **kwargs: Any,
+    ) -> list[Document]:
+        rows, _ = self._search_rows(embedding, k, filter)
+        return [self._to_document(row) for row in rows.tolist()]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: dict | None = None, **kwargs: Any
+    ) -> list[tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(
+            self.embedding.embed_query(query), k, filter
+        )
+
+    def similarity_search(
+        self, query: str, k: int = 4, filter: dict | None = None, **kwargs: Any
+    ) -> list[Document]:
+        return self.similarity_search_by_vector(
+            self.embedding.embed_query(query), k, filter
+        )
+
+    def _select_relevance_score_fn(self):
+        # Scores are cosine similarities in [-1, 1]
+        return lambda score: (score + 1) / 2
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: list[str],
+        embedding: Embeddings,
+        metadatas: list[dict] | None = None,
+        *,
+        index_dir: str,
+        **kwargs: Any,
+    ) -> "LocalVectorStore":
+        build_vector_index(Corpus(texts), embedding, index_dir)
+        return load_vector_index(index_dir, Corpus(texts), embedding, **kwargs)
+
+
+def build_vector_index(
+    docs: Sequence[str],
+    embedding: Embeddings | ShardedEmbedder,
+    index_dir: str,
+    chunk_size: int = 1024,
+    nlist: int | None = None,
+    seed: int = 0,
+) -> None:
+    """Embed *docs* chunk by chunk (or shard by shard with a
+    :class:`ShardedEmbedder`) into a float16 matrix on disk, then cluster
+    it for IVF search (*nlist* defaults to sqrt(len(docs)))."""
+    docs = as_corpus(docs)
+    index_dir = Path(index_dir)
+    tmp_dir = _make_tmp_dir(index_dir)
+    _StringTable.write((document_id(doc) for doc in docs), tmp_dir, "ids")
+
+    vectors = None
+    for start, embedded in iter_embeddings(embedding, docs, chunk_size):
+        embedded = _normalize(embedded)
+        if vectors is None:
+            vectors = np.lib.format.open_memmap(
+                tmp_dir / "vectors.npy",
+                mode="w+",
+                dtype=np.float16,
+                shape=(len(docs), embedded.shape[1]),
+            )
+        vectors[start : start + len(embedded)] = embedded
+    if vectors is None:
+        raise ValueError("Cannot build a vector index from an empty corpus")
+    vectors.flush()
+
+    nlist = min(nlist or max(1, int(np.sqrt(len(docs)))), len(docs))
+    centroids = _train_ivf(vectors, nlist, seed=seed)
+    assignment = _assign_ivf(vectors, centroids, block_size=65_536)
+    list_indptr = np.zeros(nlist + 1, dtype=np.int64)
+    np.cumsum(np.bincount(assignment, minlength=nlist), out=list_indptr[1:])
+    np.save(tmp_dir / "centroids.npy", centroids)
+    np.save(tmp_dir / "list_indptr.npy", list_indptr)
+    np.save(
+        tmp_dir / "list_rows.npy",
+        np.argsort(assignment, kind="stable").astype(np.int32),
+    )
+    _quantize(vectors, tmp_dir, block_size=65_536)
+
+    meta = {
+        "fingerprint": docs.fingerprint,
+        "n_docs": len(docs),
+        "dim": int(vectors.shape[1]),
+        "nlist": nlist,
+    }
+    (tmp_dir / "meta.json").write_text(json.dumps(meta, indent=2))
+    del vectors
+    _replace_dir(tmp_dir, index_dir)
+
+
+def load_vector_index(
+    index_dir: str,
+    docs: Sequence[str],
+    embedding: Embeddings,
+    search: str = "exact",
+    quantization: str = "none",
+    nprobe: int = 16,
+    rerank: int = 10,
+    dimension: int | None = None,
+) -> LocalVectorStore:
+    """Memory-map a vector index written by :func:`build_vector_index`."""
+    index_dir = Path(index_dir)
+    docs = as_corpus(docs)
+    meta = json.loads((index_dir / "meta.json").read_text())
+    if meta["fingerprint"] != docs.fingerprint:
+        raise ValueError(
+            f"Vector index in {index_dir} was built from a different corpus; "
+            "rebuild it with scripts/build_index.py --vectors"
+        )
+    if dimension is not None and meta["dim"] != dimension:
+        raise ValueError(
+            f"Vector index in {index_dir} holds {meta['dim']}-dim embeddings "
+            f"but {dimension} were requested; rebuild it with "
+            "scripts/build_index.py --vectors"
+        )
+    return LocalVectorStore(
+        vectors=np.load(index_dir / "vectors.npy", mmap_mode="r"),
+        ids=_StringTable.load(index_dir, "ids"),
+        docs=docs,
+        embedding=embedding,
+        meta=meta,
+        centroids=np.load(index_dir / "centroids.npy"),
+        list_indptr=np.load(index_dir / "list_indptr.npy", mmap_mode="r"),
+        list_rows=np.load(index_dir / "list_rows.npy", mmap_mode="r"),
+        quantized={
+            name: np.load(index_dir / f"{name}.npy", mmap_mode="r")
+            for name in ("int8", "int8_scale", "binary")
+        },
+        search=search,
+        quantization=quantization,
+        nprobe=nprobe,
+        rerank=rerank,
     )
 
 
+def get_vector_db(
+    backend: str = "chroma",
+    embed_model: Any = None,
+    index_path: str | None = None,
+    docs: Sequence[str] | None = None,
+    search: str = "exact",
+    quantization: str = "none",
+    dimension: int | None = None,
+    embed_cache: str | None = None,
+    batch_queries: bool = False,
+    embed_threads: int | None = None,
+    embed_server: str | None = None,
+    **chroma_kwargs: Any,
+):
+    """Vector store for dense retrieval: the Chroma server (``"chroma"``)
+    or the in-process index under *index_path* (``"local"``).  Both expose
+    the same ``as_retriever`` interface."""
+    if backend == "chroma":
+        return get_chroma_db(
+            embed_model=embed_model,
+            dimension=dimension,
+            embed_cache=embed_cache,
+            batch_queries=batch_queries,
+            embed_threads=embed_threads,
+            embed_server=embed_server,
+            **chroma_kwargs,
+        )
+    if backend == "local":
+        docs = docs if docs is not None else load_corpus(index_path)
+        index_dir = _index_dir_for(docs, index_path)
+        if index_dir is None:
+            raise ValueError(
+                "The local vector backend needs a built index set; set "
+                "INDEX_PATH and run scripts/build_index.py --vectors"
+            )
+        return load_vector_index(
+            str(index_dir / "vectors"),
+            docs=docs,
+            embedding=get_embed_model(
+                embed_model,
+                dimension,
+                embed_cache,
+                batch_queries,
+                embed_threads,
+                embed_server,
+            ),
+            search=search,
+            quantization=quantization,
+            dimension=dimension,
+        )
+    raise ValueError(f"Unknown vector backend: {backend!r}")
+
+
+def _index_dir_for(docs: Sequence[str], index_path: str | None) -> Path | None:
+    """The index set that *docs* was loaded from, otherwise the current
+    one in *index_path* (if given)."""
+    if getattr(docs, "index_dir", None) is not None:
+        return docs.index_dir
+    return index_root(index_path) if index_path else None
+
+
+def _bm25_index_for(docs: Corpus, index_path: str | None) -> BM25Index:
+    """The saved BM25 index of *docs*' index set (see
+    :func:`_index_dir_for`) if there is one, otherwise one built (and
+    cached) from *docs*."""
+    index_dir = _index_dir_for(docs, index_path)
+    if index_dir and (index_dir / "bm25").exists():
+        index = load_bm25_index(str(index_dir / "bm25"))
+        if index.meta.get("fingerprint") != docs.fingerprint:
+            raise ValueError(
+                f"BM25 index in {index_dir} was built from a different "
+                "corpus; rebuild it with scripts/build_index.py"
+            )
+        return index
+    return _cached_bm25_index(docs)
+
+
+def _entity_index_for(docs: Corpus, index_path: str | None) -> EntityIndex:
+    """Like :func:`_bm25_index_for`, for the exact-match entity index."""
+    index_dir = _index_dir_for(docs, index_path)
+    if index_dir and (index_dir / "entities").exists():
+        index = load_entity_index(str(index_dir / "entities"))
+        if index.meta.get("fingerprint") != docs.fingerprint:
+            raise ValueError(
+                f"Entity index in {index_dir} was built from a different "
+                "corpus; rebuild it with scripts/build_index.py"
+            )
+        return index
+    return _cached_entity_index(docs)
+
+
 def create_ensemble_retriever(
     chroma_db: Any, docs: list, keyword_weight: float = 0.5, **kwargs
 ):
+    from langchain_classic.retrievers import EnsembleRetriever
+
     k = kwargs.get("k") if kwargs.get("k") else 3
     c = kwargs.get("c") if kwargs.get("c") else 60
     weights = (
@@ -106,7 +1587,10 @@ def create_ensemble_retriever(
         else [1 - keyword_weight, keyword_weight]
     )
 
-    bm25_retriever = _cached_bm25_retriever(_docs_to_tuple(docs), k)
+    docs = as_corpus(docs)
+    bm25_retriever = BM25IndexRetriever(
+        index=_bm25_index_for(docs, kwargs.get("index_path")), docs=docs, k=k
+    )
 
     return EnsembleRetriever(
         retrievers=[
@@ -117,3 +1601,224 @@ def create_ensemble_retriever(
         weights=weights,
         c=c,
     )
+
+
+# Per-shard dense and sparse lookups of HybridRetriever.invoke
+_RETRIEVAL_EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+    thread_name_prefix="hybrid-retrieval"
+)
+
+
+def _rank_fusion(
+    results: list[list[Document]], weights: list[float], c: int
+) -> list[Document]:
+    """Weighted reciprocal rank fusion, ordered like langchain's
+    ``EnsembleRetriever``: by fused score, ties by first appearance."""
+    docs = [doc for result in results for doc in result]
+    if not docs:
+        return []
+    ranks = np.concatenate([np.arange(1, len(result) + 1) for result in results])
+    doc_weights = np.repeat(weights, [len(result) for result in results])
+    _, first, inverse = np.unique(
+        np.array([doc.page_content for doc in docs], dtype=object),
+        return_index=True,
+        return_inverse=True,
+    )
+    fused = np.bincount(inverse, weights=doc_weights / (ranks + c))
+    return [docs[first[i]] for i in np.lexsort((first, -fused))]
+
+
+class HybridRetriever(BaseRetriever):
+    """Dense + BM25 retriever fused with reciprocal rank fusion.
+
+    Unlike an ``EnsembleRetriever``, ``k``, ``keyword_weight`` and the
+    entity ``types`` to search can be set per call
+    (``retriever.invoke(query, keyword_weight=0.7, types=["gene"])`` or
+    ``retriever.bind(...)``), so one instance serves every weighting.
+    With *types*, only those type shards of the corpus are searched, one
+    dense and one sparse lookup per shard, all running concurrently; every
+    lookup contributes its own ranked list to the fusion.
+
+    With ``exact=True`` (keyword queries), documents whose identifier,
+    symbol or label appears verbatim in the query are looked up in the
+    *entities* index and ranked above the fuzzy results, in their fused
+    order.
+
+    When the vector store's documents carry no ``type`` metadata
+    (*typed_vectors* false), the dense side searches the whole store once
+    instead of returning nothing for every shard."""
+
+    vector_store: Any
+    sparse: BM25IndexRetriever
+    entities: Any = None
+    typed_vectors: bool = True
+    k: int = 3
+    keyword_weight: float = 0.5
+    c: int = 60
+
+    def _shards(self, types: list[str] | None) -> list[str | None]:
+        """The known type shards among *types*, or ``[None]`` (the whole
+        corpus) when there are none."""
+        shards = getattr(self.sparse.docs, "shards", {})
+        return [t for t in dict.fromkeys(types or ()) if t in shards] or [None]
+
+    def _dense_shards(self, shards: list[str | None]) -> list[str | None]:
+        return shards if self.typed_vectors else [None]
+
+    def _dense(self, vector: list[float], k: int, shard: str | None) -> list[Document]:
+        return self.vector_store.similarity_search_by_vector(
+            vector, k=k, filter={"type": shard} if shard else None
+        )
+
+    def _sparse(self, query: str, k: int, shard: str | None) -> list[Document]:
+        tokens = _tokenize(query)
+        index = self.sparse.index
+        if shard is None:
+            return self.sparse._to_documents(index.top_k(tokens, k))
+        ranges = self.sparse.docs.shards[shard]
+        ids = np.concatenate([np.arange(start, stop) for start, stop in ranges])
+        scores = np.concatenate(
+            [index.get_batch_scores([tokens], start, stop)[0] for start, stop in ranges]
+        )
+        return self.sparse._to_documents(ids[_top_k(scores, k)].tolist())
+
+    def _exact(self, query: str, k: int, shards: list[str | None]) -> list[Document]:
+        if self.entities is None:
+            return []
+        doc_ids = self.entities.search(query)
+        if shards != [None]:
+            doc_ids = [i for i in doc_ids if _doc_type(self.sparse.docs, i) in shards]
+        return self.sparse._to_documents(doc_ids[: 2 * k])
+
+    @staticmethod
+    def _exact_first(exact: list[Document], fused: list[Document]) -> list[Document]:
+        """*fused* with the *exact* hits moved to the top, the ones the
+        fuzzy search also found first, in fused order."""
+        position = {doc.page_content: i for i, doc in enumerate(fused)}
+        exact = sorted(
+            exact, key=lambda doc: position.get(doc.page_content, len(fused))
+        )
+        seen = {doc.page_content for doc in exact}
+        return exact + [doc for doc in fused if doc.page_content not in seen]
+
+    def _fuse(
+        self,
+        dense: list[list[Document]],
+        sparse: list[list[Document]],
+        keyword_weight: float,
+    ) -> list[Document]:
+        return _rank_fusion(
+            dense + sparse,
+            [1 - keyword_weight] * len(dense) + [keyword_weight] * len(sparse),
+            self.c,
+        )
+
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun,
+        k: int | None = None,
+        keyword_weight: float | None = None,
+        types: list[str] | None = None,
+        exact: bool = False,
+    ) -> list[Document]:
+        k = k or self.k
+        shards = self._shards(types)
+        exact_hits = self._exact(query, k, shards) if exact else []
+        # BM25 runs while the query is being embedded
+        sparse = [
+            _RETRIEVAL_EXECUTOR.submit(self._sparse, query, k, shard)
+            for shard in shards
+        ]
+        vector = self.vector_store.embeddings.embed_query(query)
+        dense = [
+            _RETRIEVAL_EXECUTOR.submit(self._dense, vector, k, shard)
+            for shard in self._dense_shards(shards)
+        ]
+        return self._exact_first(
+            exact_hits,
+            self._fuse(
+                [future.result() for future in dense],
+                [future.result() for future in sparse],
+                self.keyword_weight if keyword_weight is None else keyword_weight,
+            ),
+        )
+
+    async def _aget_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: Any,
+        k: int | None = None,
+        keyword_weight: float | None = None,
+        types: list[str] | None = None,
+        exact: bool = False,
+    ) -> list[Document]:
+        k = k or self.k
+        shards = self._shards(types)
+        exact_hits = self._exact(query, k, shards) if exact else []
+        sparse = [
+            asyncio.create_task(asyncio.to_thread(self._sparse, query, k, shard))
+            for shard in shards
+        ]
+        try:
+            vector = await self.vector_store.embeddings.aembed_query(query)
+            dense = await asyncio.gather(
+                *(
+                    asyncio.to_thread(self._dense, vector, k, shard)
+                    for shard in self._dense_shards(shards)
+                )
+            )
+            sparse_results = await asyncio.gather(*sparse)
+        finally:
+            # Do not leave the BM25 lookups pending when embedding failed
+            for task in sparse:
+                task.cancel()
+        return self._exact_first(
+            exact_hits,
+            self._fuse(
+                dense,
+                sparse_results,
+                self.keyword_weight if keyword_weight is None else keyword_weight,
+            ),
+        )
+
+
+def _has_typed_vectors(vector_db: Any, docs: Corpus) -> bool:
+    """Whether *vector_db* can be filtered by the corpus' type shards.
+    Chroma collections synced before types were recorded cannot."""
+    shards = list(getattr(docs, "shards", None) or ())
+    if not shards or not hasattr(vector_db, "_collection"):
+        return True
+    if vector_db.get(where={"type": {"$in": shards}}, limit=1)["ids"]:
+        return True
+    logger.warning(
+        "The Chroma collection has no type metadata, so type filters only "
+        "apply to keyword search; re-sync it with scripts/build_index.py "
+        "--sync-chroma"
+    )
+    return False
+
+
+def create_hybrid_retriever(
+    vector_db: Any,
+    docs: Sequence[str],
+    k: int = 3,
+    keyword_weight: float = 0.5,
+    c: int = 60,
+    index_path: str | None = None,
+) -> HybridRetriever:
+    """Single-pass replacement for :func:`create_ensemble_retriever`."""
+    docs = as_corpus(docs)
+    return HybridRetriever(
+        vector_store=vector_db,
+        sparse=BM25IndexRetriever(
+            index=_bm25_index_for(docs, index_path), docs=docs, k=k
+        ),
+        entities=_entity_index_for(docs, index_path),
+        typed_vectors=_has_typed_vectors(vector_db, docs),
+        k=k,
+        keyword_weight=keyword_weight,
+        c=c,
+    )
@@ -0,0 +1,55 @@
+"""HTTP front end of the shared embedding server.
+
+One process holds the embedding model; web workers reach it through
+:class:`gnais.search.embeddings.RemoteEmbeddings` over a Unix socket or
+localhost.  Query embeddings from all workers are coalesced into batched
+forward passes by the model's :class:`BatchedEmbeddings` wrapper.
+
+``POST /embed`` takes ``{"kind": "query" | "documents", "texts": [...]}``
+and answers with the vectors as little-endian float32 rows, their shape
+in the ``X-Embedding-Shape`` header (``"rows,dim"``)."""
+
+import asyncio
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from quart import Quart, Response, jsonify, request
+
+
+def encode_vectors(vectors: list[list[float]]) -> Response:
+    array = np.asarray(vectors, dtype="<f4")
+    if array.ndim != 2:
+        array = array.reshape(len(vectors), -1 if len(vectors) else 0)
+    return Response(
+        array.tobytes(),
+        content_type="application/octet-stream",
+        headers={"X-Embedding-Shape": f"{array.shape[0]},{array.shape[1]}"},
+    )
+
+
+def create_app(embedding: Embeddings, model_name: str, dimension: int | None) -> Quart:
+    app = Quart(__name__)
+
+    @app.get("/info")
+    async def info():
+        return jsonify({"model": model_name, "dimension": dimension})
+
+    @app.post("/embed")
+    async def embed():
+        body = await request.get_json(silent=True)
+        if not isinstance(body, dict):
+            return jsonify({"error": "Expected a JSON object body"}), 400
+        texts = body.get("texts") or []
+        if not isinstance(texts, list) or not all(
+            isinstance(text, str) for text in texts
+        ):
+            return jsonify({"error": "'texts' must be a list of strings"}), 400
+        if body.get("kind") == "documents":
+            vectors = await asyncio.to_thread(embedding.embed_documents, texts)
+        else:
+            vectors = await asyncio.gather(
+                *(embedding.aembed_query(text) for text in texts)
+            )
+        return encode_vectors(vectors)
+
+    return app
@@ -0,0 +1,449 @@
+"""Embedding wrappers shared by the vector stores."""
+
+import asyncio
+import concurrent.futures
+import hashlib
+import multiprocessing
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from tqdm import tqdm
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that remembers vectors by (model, dimension, text).
+
+    Query embeddings go to a bounded in-process LRU; document embeddings go
+    to a SQLite file at *path* (when given) so they survive restarts and
+    are shared between index builds."""
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        namespace: str,
+        path: str | None = None,
+        query_cache_size: int = 4096,
+        batch_size: int = 500,
+    ):
+        self.embedding = embedding
+        self.namespace = namespace
+        self.path = path
+        self.query_cache_size = query_cache_size
+        self.batch_size = batch_size
+        self.stats = Counter()
+        self._queries: OrderedDict[bytes, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key BLOB PRIMARY KEY, vector BLOB NOT NULL) WITHOUT ROWID"
+            )
+            self._db.commit()
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.namespace}\0{text}".encode("utf-8")).digest()
+
+    def _cached_query(self, key: bytes) -> list[float] | None:
+        with self._lock:
+            vector = self._queries.get(key)
+            if vector is None:
+                self.stats["query_misses"] += 1
+                return None
+            self._queries.move_to_end(key)
+            self.stats["query_hits"] += 1
+            return vector
+
+    def _remember_query(self, key: bytes, vector: list[float]) -> list[float]:
+        with self._lock:
+            self._queries[key] = vector
+            if len(self._queries) > self.query_cache_size:
+                self._queries.popitem(last=False)
+        return vector
+
+    def embed_query(self, text: str) -> list[float]:
+        key = self._key(text)
+        vector = self._cached_query(key)
+        if vector is None:
+            vector = self._remember_query(key, self.embedding.embed_query(text))
+        return vector
+
+    async def aembed_query(self, text: str) -> list[float]:
+        key = self._key(text)
+        vector = self._cached_query(key)
+        if vector is None:
+            vector = self._remember_query(key, await self.embedding.aembed_query(text))
+        return vector
+
+    def _lookup(self, keys: list[bytes]) -> dict[bytes, list[float]]:
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), self.batch_size):
+                batch = keys[start : start + self.batch_size]
+                rows = self._db.execute(
+                    "SELECT key, vector FROM embeddings WHERE key IN "
+                    f"({','.join('?' * len(batch))})",
+                    batch,
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if self._db is None:
+            self.stats["document_misses"] += len(texts)
+            return self.embedding.embed_documents(texts)
+        keys = [self._key(text) for text in texts]
+        found = self._lookup(list(set(keys)))
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        self.stats["document_hits"] += len(texts) - len(missing)
+        self.stats["document_misses"] += len(missing)
+        if missing:
+            vectors = self.embedding.embed_documents(list(missing.values()))
+            found.update(zip(missing, vectors))
+            with self._lock:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings VALUES (?, ?)",
+                    [
+                        (key, np.asarray(vector, dtype=np.float32).tobytes())
+                        for key, vector in zip(missing, vectors)
+                    ],
+                )
+                self._db.commit()
+        return [found[key] for key in keys]
+
+
+class BatchedEmbeddings(Embeddings):
+    """Coalesce concurrent query embeddings into batched forward passes.
+
+    Callers (threads or coroutines) enqueue their query and wait on a
+    future.  A single worker thread waits up to *max_wait_ms* after the
+    first request, or until *max_batch_size* requests are queued, then
+    embeds them all with one ``embed_documents`` call."""
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+    ):
+        self.embedding = embedding
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.stats = Counter()
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._worker = threading.Thread(
+            target=self._run, name="embed-batcher", daemon=True
+        )
+        self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            texts = [text for text, _ in batch]
+            try:
+                vectors = self.embedding.embed_documents(texts)
+            except Exception as exc:
+                for _, future in batch:
+                    future.set_exception(exc)
+                continue
+            self.stats["batches"] += 1
+            self.stats["queries"] += len(batch)
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+    def _submit(self, text: str) -> concurrent.futures.Future:
+        future = concurrent.futures.Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._submit(text).result()
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return await asyncio.wrap_future(self._submit(text))
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        # Document batches are already large; embed them directly
+        return self.embedding.embed_documents(texts)
+
+
+class SharedEmbeddings(Embeddings):
+    """Delegate to the embedding model returned by *factory*, created on
+    first use.
+
+    Lets components configured at import time (mem0's ``langchain``
+    embedder) hold the process-wide model that retrieval uses, without
+    loading it before it is needed."""
+
+    def __init__(self, factory: Callable[[], Embeddings]):
+        self.factory = factory
+
+    @property
+    def embedding(self) -> Embeddings:
+        return self.factory()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embedding.embed_query(text)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return await self.embedding.aembed_query(text)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embedding.embed_documents(texts)
+
+
+def decode_vectors(content: bytes, shape: str) -> np.ndarray:
+    """Vectors of an embedding server response: little-endian float32
+    rows, with ``"rows,dim"`` in the ``X-Embedding-Shape`` header."""
+    rows, dim = (int(n) for n in shape.split(","))
+    return np.frombuffer(content, dtype="<f4").reshape(rows, dim)
+
+
+class RemoteEmbeddings(Embeddings):
+    """Client of the embedding server (``scripts/embed_server.py``).
+
+    *url* is ``unix:/path/to.sock`` or ``http://host:port``.  The server
+    must serve *model_name* at *dimension*; that is checked on the first
+    request, so a misconfigured worker fails instead of mixing vector
+    spaces."""
+
+    def __init__(
+        self,
+        url: str,
+        model_name: str,
+        dimension: int | None = None,
+        timeout: float = 60.0,
+    ):
+        import httpx
+
+        self.url = url
+        self.model_name = model_name
+        self.dimension = dimension
+        if url.startswith("unix:"):
+            self._client = httpx.Client(
+                base_url="http://embed-server",
+                transport=httpx.HTTPTransport(uds=url.removeprefix("unix:")),
+                timeout=timeout,
+            )
+        else:
+            self._client = httpx.Client(base_url=url, timeout=timeout)
+        self._checked = False
+
+    def _check(self) -> None:
+        if self._checked:
+            return
+        response = self._client.get("/info")
+        response.raise_for_status()
+        info = response.json()
+        if info["model"] != self.model_name or (
+            self.dimension is not None and info["dimension"] != self.dimension
+        ):
+            raise ValueError(
+                f"Embedding server at {self.url} serves {info['model']} at "
+                f"{info['dimension']} dimensions, not {self.model_name} at "
+                f"{self.dimension}"
+            )
+        self._checked = True
+
+    def _embed(self, kind: str, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        self._check()
+        response = self._client.post("/embed", json={"kind": kind, "texts": texts})
+        response.raise_for_status()
+        return decode_vectors(
+            response.content, response.headers["X-Embedding-Shape"]
+        ).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed("query", [text])[0]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._embed("documents", texts)
+
+
+# Embedding model of a ShardedEmbedder worker process, loaded once by
+# _init_shard_worker
+_WORKER_EMBEDDING = None
+
+
+def _init_shard_worker(factory: Callable[[], Embeddings], num_threads: int) -> None:
+    global _WORKER_EMBEDDING
+    import torch
+
+    torch.set_num_threads(num_threads)
+    _WORKER_EMBEDDING = factory()
+
+
+def _embed_shard(path: str, keys: np.ndarray, texts: list[str]) -> str:
+    vectors = np.asarray(_WORKER_EMBEDDING.embed_documents(texts), dtype=np.float32)
+    # The keys file is written last: a checkpoint without one is ignored
+    for suffix, array in ((".vectors.npy", vectors), (".keys.npy", keys)):
+        tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+        np.save(tmp_path, array)
+        os.replace(tmp_path, f"{path}{suffix}")
+    return path
+
+
+def chunked(items: Iterable, size: int) -> Iterator[list]:
+    """Consecutive lists of *size* items (the last one may be shorter)."""
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class ShardedEmbedder:
+    """Embed a stream of texts on a pool of CPU worker processes.
+
+    Texts are taken from the stream in shards of *shard_size*, with at
+    most two shards per worker in flight, so memory use does not grow with
+    the corpus.  Each worker loads the model once through *factory* (a
+    picklable callable such as a ``functools.partial`` of
+    ``get_embed_model``) and uses at most *threads_per_worker* torch
+    threads.
+
+    Every embedded shard is checkpointed in *checkpoint_dir* together with
+    a hash of each of its texts.  A rerun after an interruption reuses the
+    checkpointed vector of every text it sees again, whatever its position
+    in the new stream, and only embeds the others."""
+
+    def __init__(
+        self,
+        factory: Callable[[], Embeddings],
+        namespace: str,
+        checkpoint_dir: str,
+        workers: int,
+        shard_size: int = 4096,
+        threads_per_worker: int | None = None,
+    ):
+        self.factory = factory
+        self.namespace = namespace
+        self.checkpoint_dir = Path(checkpoint_dir)
+        self.workers = workers
+        self.shard_size = shard_size
+        self.threads_per_worker = threads_per_worker or max(
+            1, (os.cpu_count() or 1) // workers
+        )
+
+    def _keys(self, texts: list[str]) -> np.ndarray:
+        """64-bit content hashes of *texts* (and the model namespace)."""
+        prefix = hashlib.sha256(self.namespace.encode("utf-8"))
+        keys = np.empty(len(texts), dtype=np.uint64)
+        for i, text in enumerate(texts):
+            digest = prefix.copy()
+            digest.update(text.encode("utf-8"))
+            keys[i] = int.from_bytes(digest.digest()[:8], "little")
+        return keys
+
+    def _checkpoints(self) -> tuple[list[str], np.ndarray, np.ndarray, np.ndarray]:
+        """Stems of the existing checkpoints, and their sorted keys with
+        the checkpoint and row holding each."""
+        stems = sorted(
+            str(path)[: -len(".keys.npy")]
+            for path in self.checkpoint_dir.glob("*.keys.npy")
+        )
+        keys = [np.load(f"{stem}.keys.npy") for stem in stems]
+        all_keys = np.concatenate(keys) if keys else np.zeros(0, dtype=np.uint64)
+        files = np.repeat(np.arange(len(keys)), [len(k) for k in keys])
+        rows = np.concatenate([np.arange(len(k)) for k in keys]) if keys else files
+        order = np.argsort(all_keys, kind="stable")
+        return stems, all_keys[order], files[order], rows[order]
+
+    def iter_embeddings(
+        self, texts: Iterable[str], total: int | None = None
+    ) -> Iterator[tuple[int, np.ndarray]]:
+        """Yield ``(start, vectors)`` for consecutive shards of *texts*, in
+        order; *total* only sizes the progress bar.  Checkpoints are
+        removed once every shard has been consumed."""
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        stems, known, files, rows = self._checkpoints()
+        checkpoints = [np.load(f"{stem}.vectors.npy", mmap_mode="r") for stem in stems]
+        window, start, resumed = deque(), 0, 0
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_shard_worker,
+            initargs=(self.factory, self.threads_per_worker),
+        ) as pool, tqdm(total=total, unit="doc") as progress:
+            for shard in chunked(texts, self.shard_size):
+                keys = self._keys(shard)
+                found = np.zeros(len(keys), dtype=bool)
+                if len(known):
+                    pos = np.minimum(np.searchsorted(known, keys), len(known) - 1)
+                    found = known[pos] == keys
+                # (row in shard, checkpoint, row in checkpoint) of resumed texts
+                hits = [(i, files[pos[i]], rows[pos[i]]) for i in np.flatnonzero(found)]
+                missing = np.flatnonzero(~found)
+                future = None
+                if len(missing):
+                    digest = hashlib.sha256(keys[missing].tobytes()).hexdigest()
+                    stem = str(self.checkpoint_dir / digest[:32])
+                    stems.append(stem)
+                    future = pool.submit(
+                        _embed_shard, stem, keys[missing], [shard[i] for i in missing]
+                    )
+                resumed += len(hits)
+                progress.set_postfix(resumed=resumed)
+                window.append((start, len(shard), hits, missing, future))
+                start += len(shard)
+                # Keep the workers busy without holding the whole stream
+                while len(window) > 2 * self.workers:
+                    yield self._collect(window.popleft(), checkpoints, progress)
+            while window:
+                yield self._collect(window.popleft(), checkpoints, progress)
+        for stem in stems:
+            for suffix in (".keys.npy", ".vectors.npy"):
+                Path(f"{stem}{suffix}").unlink(missing_ok=True)
+
+    @staticmethod
+    def _collect(
+        item: tuple, checkpoints: list[np.ndarray], progress: tqdm
+    ) -> tuple[int, np.ndarray]:
+        start, size, hits, missing, future = item
+        if future is not None:
+            embedded = np.load(f"{future.result()}.vectors.npy")
+        else:
+            embedded = checkpoints[hits[0][1]][:0]
+        shard = np.empty((size, embedded.shape[1]), dtype=np.float32)
+        shard[missing] = embedded
+        for i, checkpoint, row in hits:
+            shard[i] = checkpoints[checkpoint][row]
+        progress.update(size)
+        return start, shard
+
+
+def iter_embeddings(
+    embedding: "Embeddings | ShardedEmbedder",
+    texts: Sequence[str],
+    chunk_size: int = 1024,
+) -> Iterator[tuple[int, np.ndarray]]:
+    """Yield ``(start, vectors)`` chunks of *texts* embedded in order, in
+    parallel when *embedding* is a :class:`ShardedEmbedder`."""
+    if isinstance(embedding, ShardedEmbedder):
+        yield from embedding.iter_embeddings(texts, total=len(texts))
+        return
+    for start in tqdm(range(0, len(texts), chunk_size)):
+        chunk = list(texts[start : start + chunk_size])
+        yield start, np.asarray(embedding.embed_documents(chunk))
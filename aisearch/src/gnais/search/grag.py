@@ -6,6 +6,7 @@ import functools
 import dspy
 from gnais.search import tools
 from gnais.search.prompts import GENERAL_SYSTEM_PROMPT, SPARQL_SYSTEM_PROMPT
+from gnais.search.sparql import SPARQL_BREAKERS, CircuitOpenError
 from gnais.search.tools import build_schema_hint, route_model, sparql_fetch, with_memory
 
 
@@ -117,6 +118,11 @@ async def graph_rag_search(
     user_id: str = "default_user",
     chat_history: list = [],
 ):
+    try:
+        SPARQL_BREAKERS.get(sparql_url).check(claim=False)
+    except CircuitOpenError:
+        yield {"status": "Knowledge graph is unavailable, skipping GraphRAG."}
+        raise
     grag_prompt = f"{system_prompt}\nQuery: {query}"
     sparql_prompt = f"{SPARQL_SYSTEM_PROMPT}\nQuery: {query}"
     schema_hint = build_schema_hint(sparql_url)
@@ -2,6 +2,8 @@
 
 __all__ = (
     "hybrid_search",
+    "warmup",
+    "RESOURCES",
     "Synthesis",
     "StreamEvent",
 )
@@ -15,9 +17,15 @@ import dspy
 from gnais.config import Config
 from gnais.search.agent import agent_search
 from gnais.search.classification import classify_search
-from gnais.search.corpus import create_ensemble_retriever, get_chroma_db, get_docs
+from gnais.search.corpus import (
+    create_hybrid_retriever,
+    get_embed_model,
+    get_vector_db,
+    load_corpus,
+)
 from gnais.search.grag import graph_rag_search
 from gnais.search.rag import rag_search
+from gnais.search.resources import ResourceRegistry
 from gnais.search.tools import LLM_EXECUTOR, route_model
 from typing_extensions import TypedDict
 
@@ -76,32 +84,77 @@ _synthesize = dspy.streamify(
 )
 
 
-# KLUDGE: Creating the retrievers takes the longest time.  Here, we
-# create them at module time once.  XXXX: Find a better way to remove
-# these globals!
-_CHROMA_DB = get_chroma_db(
-    chroma_host="localhost",
-    chroma_port=8000,
-    embed_model="Qwen/Qwen3-Embedding-0.6B",
+# Creating the retrievers takes the longest time, so they are loaded on
+# first use (or up front by warmup()) and shared by every search after.
+RESOURCES = ResourceRegistry()
+_DOCS = RESOURCES.register(
+    "corpus", partial(load_corpus, Config.INDEX_PATH, Config.CORPUS_PATH)
 )
-_DOCS = get_docs(Config.CORPUS_PATH)
-_KW_RETRIEVER = create_ensemble_retriever(
-    chroma_db=_CHROMA_DB, docs=_DOCS, keyword_weight=0.7
+# Loaded on its own so warmup() overlaps it with reading the corpus; the
+# arguments match get_vector_db's call, which then hits the same cache
+_EMBEDDINGS = RESOURCES.register(
+    "embeddings",
+    partial(
+        get_embed_model,
+        "Qwen/Qwen3-Embedding-0.6B",
+        Config.EMBED_DIM,
+        Config.EMBED_CACHE_PATH,
+        True,
+        Config.EMBED_THREADS or None,
+        Config.EMBED_SERVER,
+    ),
 )
-_SEM_RETRIEVER = create_ensemble_retriever(
-    chroma_db=_CHROMA_DB, docs=_DOCS, keyword_weight=0.5
+
+
+def _load_vector_db():
+    _EMBEDDINGS.get()
+    return get_vector_db(
+        backend=Config.VECTOR_BACKEND,
+        embed_model="Qwen/Qwen3-Embedding-0.6B",
+        index_path=Config.INDEX_PATH,
+        docs=_DOCS.get(),
+        search=Config.VECTOR_SEARCH,
+        quantization=Config.VECTOR_QUANTIZATION,
+        dimension=Config.EMBED_DIM,
+        embed_cache=Config.EMBED_CACHE_PATH,
+        batch_queries=True,
+        embed_threads=Config.EMBED_THREADS or None,
+        embed_server=Config.EMBED_SERVER,
+        chroma_host="localhost",
+        chroma_port=8000,
+    )
+
+
+_VECTOR_DB = RESOURCES.register("vector_db", _load_vector_db)
+_RETRIEVER = RESOURCES.register(
+    "retriever",
+    lambda: create_hybrid_retriever(
+        vector_db=_VECTOR_DB.get(),
+        docs=_DOCS.get(),
+        index_path=Config.INDEX_PATH,
+    ),
 )
 
 
+def warmup() -> dict[str, float]:
+    """Load every retrieval resource now, in parallel, instead of on the
+    first RAG search.  Returns the load time of each resource."""
+    return RESOURCES.warmup()
+
+
 async def _rag_search(query: str, user_id: str = "default_user", memory=None):
     yield {"status": "Classifying search type…"}
     loop = asyncio.get_running_loop()
+    docs = await _DOCS.aget()
     classification = await loop.run_in_executor(
-        tools.LLM_EXECUTOR, classify_search, query
+        LLM_EXECUTOR, classify_search, query, tuple(sorted(docs.shards))
     )
     yield {"status": f"Search type is: '{classification.get('decision')}'"}
-    retriever = (
-        _KW_RETRIEVER if classification.get("decision") == "keyword" else _SEM_RETRIEVER
+    keyword = classification.get("decision") == "keyword"
+    retriever = (await _RETRIEVER.aget()).bind(
+        keyword_weight=0.7 if keyword else 0.5,
+        types=classification.get("entity_types") or None,
+        exact=keyword,
     )
     yield {"status": "Retrieving documents…"}
     async for item in rag_search(
@@ -152,7 +205,9 @@ async def hybrid_search(query: str, user_id: str = "default_user", memory=None):
     """Run hybrid search with concurrent RAG, GraphRAG, and Agent.
 
     Yields :class:`StreamEvent` dicts for progress from each component,
-    followed by a final synthesis event with ``source="hybrid"``.
+    followed by a final synthesis event with ``source="hybrid"``.  A
+    failing component (e.g. GraphRAG while the SPARQL circuit is open)
+    emits an ``error`` event; the synthesis uses the others.
     """
     total_start = time.monotonic()
     queue: asyncio.Queue = asyncio.Queue()
@@ -187,6 +242,11 @@ async def hybrid_search(query: str, user_id: str = "default_user", memory=None):
 
             if event["kind"] == "final":
                 combined_outputs[event["source"]] = event["content"]
+            elif event["kind"] == "error":
+                # Synthesize from the healthy components, saying what's missing
+                combined_outputs[event["source"]] = (
+                    f"({event['source']} unavailable: {event['content']})"
+                )
             elif event["kind"] == "done":
                 remaining -= 1
 
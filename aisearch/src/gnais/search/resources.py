@@ -0,0 +1,83 @@
+"""Lazily loaded, warmable search resources.
+
+Loading the corpus, the embedding model and the vector store takes tens
+of seconds, so they are registered here and only loaded on first use (or
+all at once by :meth:`ResourceRegistry.warmup` when a server starts)."""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+
+class LazyResource:
+    """A value created by *loader* on first :meth:`get`, once, even when
+    several threads ask for it at the same time."""
+
+    _UNSET = object()
+
+    def __init__(self, name: str, loader: Callable[[], Any]):
+        self.name = name
+        self.loader = loader
+        self.load_time: float | None = None
+        self._value = self._UNSET
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._value is not self._UNSET
+
+    def get(self) -> Any:
+        if self._value is self._UNSET:
+            with self._lock:
+                if self._value is self._UNSET:
+                    start = time.monotonic()
+                    value = self.loader()
+                    self.load_time = time.monotonic() - start
+                    print(f"Loaded {self.name} in {self.load_time:.2f}s")
+                    self._value = value
+        return self._value
+
+    async def aget(self) -> Any:
+        """Like :meth:`get`, but loads in a worker thread so a cold start
+        does not block the event loop."""
+        if self._value is not self._UNSET:
+            return self._value
+        return await asyncio.to_thread(self.get)
+
+
+class ResourceRegistry:
+    """Named :class:`LazyResource` objects.  Loaders may ``get`` other
+    resources of the registry; they are loaded (once) on demand."""
+
+    def __init__(self):
+        self._resources: dict[str, LazyResource] = {}
+
+    def register(self, name: str, loader: Callable[[], Any]) -> LazyResource:
+        if name in self._resources:
+            raise ValueError(f"Resource {name!r} is already registered")
+        resource = self._resources[name] = LazyResource(name, loader)
+        return resource
+
+    def __getitem__(self, name: str) -> LazyResource:
+        return self._resources[name]
+
+    def warmup(self, names: list[str] | None = None) -> dict[str, float]:
+        """Load *names* (default: every resource) in parallel threads and
+        return how long each resource took to load."""
+        resources = [self._resources[name] for name in names or self._resources]
+        with ThreadPoolExecutor(
+            max_workers=max(len(resources), 1), thread_name_prefix="warmup"
+        ) as executor:
+            # Re-raise the first loader error, if any
+            list(executor.map(LazyResource.get, resources))
+        return self.timings()
+
+    def timings(self) -> dict[str, float]:
+        """Load time, in seconds, of every resource loaded so far."""
+        return {
+            name: resource.load_time
+            for name, resource in self._resources.items()
+            if resource.load_time is not None
+        }
@@ -0,0 +1,573 @@
+"""Pooled HTTP clients for the SPARQL endpoints, adaptive limits on
+their concurrency, circuit breakers, and a Redis cache of their
+results."""
+
+import asyncio
+import contextlib
+import functools
+import hashlib
+import importlib.util
+import json
+import logging
+import threading
+import time
+import weakref
+import zlib
+from collections import Counter, OrderedDict, deque
+from typing import Awaitable, Callable, Hashable
+
+import httpx
+from gnais.config import Config
+from gnais.search.canonical import CanonicalQuery, canonicalize, rename_variables
+
+logger = logging.getLogger(__name__)
+
+
+class SparqlClients:
+    """One long-lived, pooled ``httpx.AsyncClient`` per endpoint and event
+    loop.
+
+    Concurrent queries to an endpoint share keep-alive connections instead
+    of each opening (and leaking) its own.  httpx clients are bound to the
+    loop they are first used on, hence one per loop: the server's loop,
+    plus the short-lived loops of ``asyncio.run`` in tool threads, which
+    must :meth:`aclose` theirs before returning."""
+
+    def __init__(
+        self,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 30.0,
+        http2: bool = True,
+        timeout: float = 180.0,
+        connect_timeout: float = 5.0,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        # HTTP/2 needs the optional h2 package (pip install httpx[http2])
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def get(self, endpoint: str) -> httpx.AsyncClient:
+        """The client for *endpoint* on the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._clients.setdefault(loop, {})
+            client = clients.get(endpoint)
+            if client is None or client.is_closed:
+                client = clients[endpoint] = httpx.AsyncClient(
+                    timeout=self.timeout, limits=self.limits, http2=self.http2
+                )
+        return client
+
+    async def aclose(self) -> None:
+        """Close the clients of the running event loop."""
+        with self._lock:
+            clients = self._clients.pop(asyncio.get_running_loop(), {})
+            # Clients of loops that are gone can no longer be closed cleanly
+            for loop in [loop for loop in self._clients if loop.is_closed()]:
+                del self._clients[loop]
+        for client in clients.values():
+            await client.aclose()
+
+
+class AdaptiveLimiter:
+    """Limit on the queries in flight to one endpoint, adjusted by AIMD.
+
+    Each query answered within *latency_target* seconds raises the limit
+    by ``1/limit`` (about one per round of queries); a 5xx answer or a
+    timeout cuts it by *backoff*, at most once per typical latency so that
+    one burst of failures counts once.  The limit stays between *minimum*
+    and *maximum*.
+
+    Queries over the limit wait in one queue per *group* (one per
+    ``sparql_fetch`` call), and the queues are served round-robin: a
+    request with many queries cannot starve the others.  The limiter is
+    shared by all event loops of the process."""
+
+    def __init__(
+        self,
+        initial: int = 4,
+        minimum: int = 1,
+        maximum: int = 20,
+        latency_target: float = 5.0,
+        backoff: float = 0.5,
+    ):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.in_flight = 0
+        self.latency: float | None = None
+        self.stats = Counter()
+        self._last_decrease = 0.0
+        self._waiters: OrderedDict[Hashable, deque[asyncio.Future]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _grant(self, future: asyncio.Future) -> None:
+        # On the waiter's loop; the slot is already counted as in flight
+        if future.cancelled():
+            self.release()
+        else:
+            future.set_result(None)
+
+    def _wake(self) -> None:
+        # Called with the lock held
+        while self._waiters and self.in_flight < int(self.limit):
+            group, queue = next(iter(self._waiters.items()))
+            future = queue.popleft()
+            if queue:
+                self._waiters.move_to_end(group)
+            else:
+                del self._waiters[group]
+            if future.cancelled():
+                continue
+            try:
+                future.get_loop().call_soon_threadsafe(self._grant, future)
+            except RuntimeError:  # Its loop is closed
+                continue
+            self.in_flight += 1
+
+    async def acquire(self, group: Hashable = None) -> None:
+        with self._lock:
+            if not self._waiters and self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.setdefault(group, deque()).append(future)
+            self.stats["queued"] += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                with contextlib.suppress(KeyError, ValueError):
+                    self._waiters[group].remove(future)
+                    if not self._waiters[group]:
+                        del self._waiters[group]
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self, latency: float | None = None, overloaded: bool = False) -> None:
+        """Free a slot, adjusting the limit by the outcome of its query:
+        its *latency* if it succeeded, or whether the endpoint was
+        *overloaded*."""
+        with self._lock:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if overloaded:
+                self.stats["overloaded"] += 1
+                if now - self._last_decrease > (self.latency or 1.0):
+                    self.limit = max(self.minimum, self.limit * self.backoff)
+                    self._last_decrease = now
+            elif latency is not None:
+                self.latency = (
+                    latency
+                    if self.latency is None
+                    else 0.8 * self.latency + 0.2 * latency
+                )
+                if latency <= self.latency_target:
+                    self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._wake()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, group: Hashable = None):
+        """Hold a slot for one HTTP request to the endpoint."""
+        await self.acquire(group)
+        start = time.monotonic()
+        try:
+            yield
+        except (httpx.TimeoutException, httpx.HTTPStatusError) as e:
+            self.release(
+                overloaded=not isinstance(e, httpx.HTTPStatusError)
+                or e.response.status_code >= 500
+            )
+            raise
+        except BaseException:
+            self.release()
+            raise
+        else:
+            self.release(latency=time.monotonic() - start)
+
+    def state(self) -> dict:
+        with self._lock:
+            return dict(
+                self.stats,
+                limit=round(self.limit, 2),
+                in_flight=self.in_flight,
+                waiting=sum(len(queue) for queue in self._waiters.values()),
+                latency=self.latency,
+            )
+
+
+class CircuitOpenError(RuntimeError):
+    """The endpoint's circuit is open: it is not queried for now."""
+
+
+class CircuitBreaker:
+    """Stops querying an endpoint that is failing, instead of making every
+    request wait through its timeouts and retries.
+
+    The circuit opens when, over the last *window* seconds, at least
+    *min_calls* queries were made and *failure_rate* of them failed: a 5xx
+    answer, a timeout or connection error, or an answer slower than
+    *slow_call* seconds.  While open, :meth:`check` raises
+    :class:`CircuitOpenError`.  After *open_for* seconds it is half-open
+    and lets one trial query through: the circuit closes if that succeeds
+    and opens again if not.  The breaker is shared by all event loops of
+    the process."""
+
+    def __init__(
+        self,
+        failure_rate: float = 0.5,
+        min_calls: int = 5,
+        window: float = 60.0,
+        slow_call: float = 30.0,
+        open_for: float = 30.0,
+        name: str = "SPARQL endpoint",
+    ):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.slow_call = slow_call
+        self.open_for = open_for
+        self.name = name
+        self.stats = Counter()
+        self._outcomes: deque[tuple[float, bool]] = deque()
+        self._opened_at: float | None = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def status(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.open_for:
+            return "open"
+        return "half_open"
+
+    def available(self) -> bool:
+        """Whether a query would be let through now."""
+        with self._lock:
+            status = self.status
+            return status == "closed" or (status == "half_open" and not self._trial)
+
+    def check(self, claim: bool = True) -> bool:
+        """Raise :class:`CircuitOpenError` unless a query may go ahead;
+        whether it is the half-open trial (taken only if *claim*)."""
+        with self._lock:
+            status = self.status
+            if status == "closed":
+                return False
+            if status == "half_open" and not self._trial:
+                self._trial = claim
+                return claim
+            self.stats["rejected"] += 1
+            retry_in = max(0.0, self._opened_at + self.open_for - time.monotonic())
+        raise CircuitOpenError(
+            f"{self.name} is unavailable (circuit open); retrying in {retry_in:.0f}s"
+        )
+
+    def record(
+        self, failed: bool, latency: float | None = None, trial: bool = False
+    ) -> None:
+        """Record the outcome of a query let through by :meth:`check`."""
+        failed = failed or (latency is not None and latency > self.slow_call)
+        now = time.monotonic()
+        with self._lock:
+            self.stats["failures" if failed else "successes"] += 1
+            if self._opened_at is not None:
+                # The half-open trial decides; stragglers from before don't
+                if trial:
+                    self._trial = False
+                    if failed:
+                        self._open(now)
+                    else:
+                        self._opened_at = None
+                        self._outcomes.clear()
+                        logger.info("%s: circuit closed", self.name)
+                return
+            self._outcomes.append((now, failed))
+            while self._outcomes and self._outcomes[0][0] < now - self.window:
+                self._outcomes.popleft()
+            failures = sum(failed for _, failed in self._outcomes)
+            if len(
+                self._outcomes
+            ) >= self.min_calls and failures >= self.failure_rate * len(self._outcomes):
+                self._open(now)
+
+    def _open(self, now: float) -> None:
+        # Called with the lock held
+        self._opened_at = now
+        self.stats["opened"] += 1
+        logger.warning("%s: circuit open for %.0fs", self.name, self.open_for)
+
+    @contextlib.contextmanager
+    def guard(self):
+        """Check the circuit, then record the outcome of the enclosed
+        HTTP request."""
+        trial = self.check()
+        start = time.monotonic()
+        try:
+            yield
+        except httpx.HTTPStatusError as e:
+            self.record(failed=e.response.status_code >= 500, trial=trial)
+            raise
+        except httpx.TransportError:
+            self.record(failed=True, trial=trial)
+            raise
+        except BaseException:
+            # Not the endpoint's fault; let another query be the trial
+            if trial:
+                with self._lock:
+                    self._trial = False
+            raise
+        else:
+            self.record(failed=False, latency=time.monotonic() - start, trial=trial)
+
+    def state(self) -> dict:
+        with self._lock:
+            return dict(self.stats, status=self.status)
+
+
+class PerEndpoint:
+    """One ``factory(**options)``, a limiter or breaker, per endpoint."""
+
+    def __init__(self, factory: Callable, **options):
+        self.factory = factory
+        self.options = options
+        self._instances: dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def get(self, endpoint: str):
+        with self._lock:
+            if endpoint not in self._instances:
+                self._instances[endpoint] = self.factory(**self.options)
+            return self._instances[endpoint]
+
+    def report(self) -> dict:
+        with self._lock:
+            instances = dict(self._instances)
+        return {endpoint: instance.state() for endpoint, instance in instances.items()}
+
+
+class SparqlCache:
+    """Redis cache of SPARQL results, shared by all workers.
+
+    Results are stored zlib-compressed for *ttl* seconds under a key
+    derived from the endpoint, the graph version and the canonical form of
+    the query (see :mod:`gnais.search.canonical`), so that variants of a
+    query differing only in layout or variable names share one entry.  The graph
+    version is a counter in Redis (``<prefix>:version:<endpoint>``, bumped
+    by :meth:`bump` after a data load) combined, when *version_query* is
+    set, with a hash of that probe query's result, re-checked at most every
+    *version_interval* seconds.  A new version orphans every cached result
+    at once; they expire with their TTL.
+
+    Concurrent lookups of an endpoint's version share one probe.  When a
+    probe fails, the last good version is kept and re-checked after
+    *version_retry* seconds; without one, the cache is bypassed for that
+    long instead of probing again on every query.
+
+    Cache failures never fail a query: it is then simply executed."""
+
+    def __init__(
+        self,
+        ttl: int = 86400,
+        version_query: str | None = None,
+        version_interval: float = 300.0,
+        prefix: str = "gnais:sparql",
+        default_graph: str | None = None,
+        version_retry: float = 30.0,
+    ):
+        self.ttl = ttl
+        self.version_query = version_query
+        self.version_interval = version_interval
+        self.prefix = prefix
+        self.default_graph = default_graph
+        self.version_retry = version_retry
+        self.stats = Counter()
+        # Endpoint -> (valid until, version)
+        self._versions: dict[str, tuple[float, str]] = {}
+        # Endpoint -> time of the last failed probe, while no version is known
+        self._failed: dict[str, float] = {}
+        # (endpoint, event loop) -> the probe in flight
+        self._probes: dict[tuple[str, asyncio.AbstractEventLoop], asyncio.Future] = {}
+
+    @functools.cached_property
+    def _redis(self):
+        import redis
+
+        # Short timeouts: a missing Redis must not stall the queries
+        return redis.Redis(
+            host="localhost", port=6379, socket_timeout=1, socket_connect_timeout=1
+        )
+
+    def _version_key(self, endpoint: str) -> str:
+        return f"{self.prefix}:version:{endpoint}"
+
+    def canonical(self, query: str) -> CanonicalQuery:
+        """Canonical form of *query*; just stripped if it cannot be parsed."""
+        try:
+            return canonicalize(query, self.default_graph)
+        except ValueError:
+            return CanonicalQuery(query.strip(), {})
+
+    def key(self, endpoint: str, version: str, query: str) -> str:
+        digest = hashlib.sha256(f"{endpoint}\0{query.strip()}".encode()).hexdigest()
+        return f"{self.prefix}:result:{version}:{digest}"
+
+    async def version(
+        self, endpoint: str, execute: Callable[[str], Awaitable[dict]]
+    ) -> str:
+        checked = self._versions.get(endpoint)
+        if checked and time.monotonic() < checked[0]:
+            return checked[1]
+        failed = self._failed.get(endpoint)
+        if failed and time.monotonic() - failed < self.version_retry:
+            raise RuntimeError(f"The graph version of {endpoint} is unavailable")
+        key = (endpoint, asyncio.get_running_loop())
+        probe = self._probes.get(key)
+        if probe is None:
+            probe = asyncio.ensure_future(self._probe(endpoint, execute))
+            self._probes[key] = probe
+            probe.add_done_callback(lambda _: self._probes.pop(key, None))
+        # A cancelled caller must not cancel the probe others are waiting on
+        return await asyncio.shield(probe)
+
+    async def _probe(
+        self, endpoint: str, execute: Callable[[str], Awaitable[dict]]
+    ) -> str:
+        checked = self._versions.get(endpoint)
+        try:
+            counter = await asyncio.to_thread(
+                self._redis.get, self._version_key(endpoint)
+            )
+            version = (counter or b"0").decode()
+            if self.version_query:
+                result = await execute(self.version_query)
+                bindings = json.dumps(result.get("results", {}), sort_keys=True)
+                version += "-" + hashlib.sha256(bindings.encode()).hexdigest()[:16]
+        except Exception as e:
+            if checked is None:
+                self._failed[endpoint] = time.monotonic()
+                raise
+            logger.warning(
+                "Could not check the graph version of %s (%s); keeping %s",
+                endpoint,
+                e,
+                checked[1],
+            )
+            version = checked[1]
+            self._versions[endpoint] = (time.monotonic() + self.version_retry, version)
+            return version
+        self._failed.pop(endpoint, None)
+        self._versions[endpoint] = (time.monotonic() + self.version_interval, version)
+        return version
+
+    def bump(self, endpoint: str) -> int:
+        """Invalidate every cached result of *endpoint* (in all workers
+        within *version_interval*; in this one immediately)."""
+        self._versions.pop(endpoint, None)
+        self._failed.pop(endpoint, None)
+        return self._redis.incr(self._version_key(endpoint))
+
+    def _count(self, event: str) -> None:
+        self.stats[event] += 1
+        try:
+            self._redis.hincrby(f"{self.prefix}:stats", event, 1)
+        except Exception:
+            self.stats["errors"] += 1
+
+    def report(self) -> dict:
+        """Hit and miss counts and hit rate of this process and, as far as
+        Redis is reachable, of all workers together."""
+
+        def _with_rate(counts: dict) -> dict:
+            lookups = counts.get("hits", 0) + counts.get("misses", 0)
+            return dict(
+                counts, hit_rate=counts.get("hits", 0) / lookups if lookups else None
+            )
+
+        report = {"process": _with_rate(dict(self.stats))}
+        try:
+            counts = self._redis.hgetall(f"{self.prefix}:stats")
+            report["all_workers"] = _with_rate(
+                {name.decode(): int(count) for name, count in counts.items()}
+            )
+        except Exception:
+            pass
+        return report
+
+    async def fetch(
+        self,
+        endpoint: str,
+        query: str,
+        execute: Callable[[str], Awaitable[dict]],
+    ) -> dict:
+        """The result of *query*, from the cache or by awaiting
+        ``execute(query)`` (and caching it).
+
+        Results are cached with canonical variable names and handed back
+        with the names of *query*."""
+        if not self.ttl:
+            return await execute(query)
+        canonical = self.canonical(query)
+        try:
+            version = await self.version(endpoint, execute)
+            key = self.key(endpoint, version, canonical.text)
+            blob = await asyncio.to_thread(self._redis.get, key)
+        except Exception:
+            self.stats["errors"] += 1
+            return await execute(query)
+        if blob is not None:
+            await asyncio.to_thread(self._count, "hits")
+            original = {new: old for old, new in canonical.variables.items()}
+            return rename_variables(json.loads(zlib.decompress(blob)), original)
+        await asyncio.to_thread(self._count, "misses")
+        result = await execute(query)
+        try:
+            stored = rename_variables(result, canonical.variables)
+            blob = zlib.compress(json.dumps(stored).encode(), level=6)
+            await asyncio.to_thread(self._redis.setex, key, self.ttl, blob)
+        except Exception:
+            self.stats["errors"] += 1
+        return result
+
+
+SPARQL_CLIENTS = SparqlClients(
+    max_connections=Config.SPARQL_MAX_CONNECTIONS,
+    max_keepalive_connections=Config.SPARQL_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=Config.SPARQL_KEEPALIVE_EXPIRY,
+    http2=Config.SPARQL_HTTP2,
+)
+
+SPARQL_LIMITERS = PerEndpoint(
+    AdaptiveLimiter,
+    initial=Config.SPARQL_INITIAL_CONCURRENCY,
+    maximum=Config.SPARQL_MAX_CONNECTIONS,
+    latency_target=Config.SPARQL_LATENCY_TARGET,
+)
+
+SPARQL_BREAKERS = PerEndpoint(
+    CircuitBreaker,
+    failure_rate=Config.SPARQL_BREAKER_FAILURE_RATE,
+    min_calls=Config.SPARQL_BREAKER_MIN_CALLS,
+    window=Config.SPARQL_BREAKER_WINDOW,
+    slow_call=Config.SPARQL_BREAKER_SLOW_CALL,
+    open_for=Config.SPARQL_BREAKER_OPEN_FOR,
+)
+
+SPARQL_CACHE = SparqlCache(
+    ttl=Config.SPARQL_CACHE_TTL,
+    version_query=Config.SPARQL_VERSION_QUERY,
+    version_interval=Config.SPARQL_VERSION_INTERVAL,
+    version_retry=Config.SPARQL_VERSION_RETRY,
+    default_graph=Config.SPARQL_DEFAULT_GRAPH,
+)
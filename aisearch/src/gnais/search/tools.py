@@ -8,10 +8,22 @@ from typing import Any
 
 import dspy
 import httpx
-import redis
 from gnais.config import Config
+from gnais.search.sparql import (
+    SPARQL_BREAKERS,
+    SPARQL_CACHE,
+    SPARQL_CLIENTS,
+    SPARQL_LIMITERS,
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _redis():
+    """Shared Redis client, created on first use rather than at import."""
+    import redis
+
+    return redis.Redis(host="localhost", port=6379, decode_responses=True)
 
-_redis = redis.Redis(host="localhost", port=6379, decode_responses=True)
 
 # Dedicated thread pool for LLM inference so heavy model calls don't
 # saturate the default asyncio executor used for lighter I/O work.
@@ -32,21 +44,29 @@ async def _exec_sparql(
     query: str,
     max_retries: int = 3,
     base_delay: float = 1,
+    group: Any = None,
 ) -> dict:
-    """Execute a single SPARQL query with retry + exponential jitter via httpx."""
-    client = httpx.AsyncClient(
-        timeout=httpx.Timeout(180.0, connect=5.0),
-        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
-    )
+    """Execute a single SPARQL query with retry + exponential jitter via httpx.
+
+    Each attempt waits for a slot of the endpoint's adaptive limiter, in
+    the queue of *group*, and raises CircuitOpenError at once while the
+    endpoint's circuit breaker is open."""
+    client = SPARQL_CLIENTS.get(sparql_uri)
+    limiter = SPARQL_LIMITERS.get(sparql_uri)
+    breaker = SPARQL_BREAKERS.get(sparql_uri)
     for attempt in range(max_retries):
         try:
-            resp = await client.post(
-                sparql_uri,
-                data={"query": query},
-                headers={"Accept": "application/sparql-results+json"},
-            )
-            resp.raise_for_status()
-            return resp.json()
+            # Fail before queueing for a slot, not only after
+            breaker.check(claim=False)
+            async with limiter.slot(group):
+                with breaker.guard():
+                    resp = await client.post(
+                        sparql_uri,
+                        data={"query": query},
+                        headers={"Accept": "application/sparql-results+json"},
+                    )
+                    resp.raise_for_status()
+                    return resp.json()
         except httpx.HTTPStatusError as e:
             if e.response.status_code in (504, 503, 502) and attempt < max_retries - 1:
                 await asyncio.sleep(base_delay * (2**attempt) + random.uniform(0, 1))
@@ -61,7 +81,7 @@ def build_schema_hint(sparql_uri: str) -> str:
     Cached in Redis for 1 week so multiple workers / restarts share it.
     """
     cache_key = f"gn:schema_hint:{sparql_uri}"
-    cached = _redis.get(cache_key)
+    cached = _redis().get(cache_key)
     if cached:
         return cached
 
@@ -414,7 +434,7 @@ WHERE {
 }
 ```
     """
-    _redis.setex(cache_key, 604800, hint)  # 1 week
+    _redis().setex(cache_key, 604800, hint)  # 1 week
     return hint
 
 
@@ -476,23 +496,63 @@ async def sparql_fetch(
     max_retries: int = 3,
     base_delay: float = 0.5,
 ) -> str:
-    """Execute *sparql_queries* concurrently against *sparql_uri*."""
+    """Execute *sparql_queries* concurrently against *sparql_uri*.
+
+    Queries that are the same up to layout and variable names (see
+    :mod:`gnais.search.canonical`) run only once."""
     if not sparql_queries:
         return "No SPARQL queries to run."
 
+    # This call's queries queue together, and take turns with other calls'
+    group = object()
+
     async def _fetch_one(query: str, idx: int) -> str:
         try:
-            result = await _exec_sparql(sparql_uri, query, max_retries, base_delay)
+            result = await SPARQL_CACHE.fetch(
+                sparql_uri,
+                query,
+                functools.partial(
+                    _exec_sparql,
+                    sparql_uri,
+                    max_retries=max_retries,
+                    base_delay=base_delay,
+                    group=group,
+                ),
+            )
             bindings = result.get("results", {}).get("bindings", [])
             return f"Query {idx} succeeded ({len(bindings)} rows): {bindings}"
         except Exception as e:
             return f"Query {idx} failed: {e}\nQuery was:\n{query}"
 
-    tasks = [_fetch_one(q, i) for i, q in enumerate(sparql_queries)]
-    results = await asyncio.gather(*tasks)
+    first_of: dict[str, int] = {}
+    duplicates: dict[int, int] = {}
+    for idx, query in enumerate(sparql_queries):
+        text = SPARQL_CACHE.canonical(query).text
+        duplicates[idx] = first_of.setdefault(text, idx)
+    unique = [idx for idx, first in duplicates.items() if first == idx]
+    fetched = dict(
+        zip(
+            unique,
+            await asyncio.gather(
+                *(_fetch_one(sparql_queries[idx], idx) for idx in unique)
+            ),
+        )
+    )
+    results = [
+        fetched[idx] if first == idx else f"Query {idx} is the same as query {first}."
+        for idx, first in duplicates.items()
+    ]
     return "\n\n".join(results)
 
 
+async def _sparql_fetch_and_close(sparql_queries: list[str], sparql_uri: str) -> str:
+    # For a throwaway event loop (asyncio.run): close its pooled clients
+    try:
+        return await sparql_fetch(sparql_queries, sparql_uri)
+    finally:
+        await SPARQL_CLIENTS.aclose()
+
+
 @functools.lru_cache(maxsize=64)
 def make_sparql_fetch_tool(
     sparql_uri: str, lm: dspy.LM = Config.DEFAULT_LLM
@@ -509,7 +569,7 @@ def make_sparql_fetch_tool(
         if not sparql_queries:
             return "No SPARQL queries generated."
         future = LLM_EXECUTOR.submit(
-            asyncio.run, sparql_fetch(sparql_queries, sparql_uri)
+            asyncio.run, _sparql_fetch_and_close(sparql_queries, sparql_uri)
         )
         return future.result()
 
@@ -11,8 +11,15 @@ from flask_caching import Cache
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from gnais.config import Config
+from gnais.search.corpus import memory_embedder
 from gnais.search.prompts import GN_FACT_EXTRACTION_PROMPT, GN_UPDATE_MEMORY_PROMPT
-from gnais.search.ragent import hybrid_search
+from gnais.search.ragent import hybrid_search, warmup
+from gnais.search.sparql import (
+    SPARQL_BREAKERS,
+    SPARQL_CACHE,
+    SPARQL_CLIENTS,
+    SPARQL_LIMITERS,
+)
 from markupsafe import escape
 from mem0 import Memory
 from mem0.configs.base import MemoryConfig
@@ -80,6 +87,18 @@ async def _set_default_executor():
     loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(max_workers=64))
 
 
+@app.before_serving
+async def _warmup_retrievers():
+    # Load the corpus, embedding model and indexes before the first request
+    # instead of when the module is imported; each load time is printed
+    await asyncio.to_thread(warmup)
+
+
+@app.after_serving
+async def _close_sparql_clients():
+    await SPARQL_CLIENTS.aclose()
+
+
 #  Shared mem0 memory instance (loaded once at server startup)
 _MEMORY = Memory(
     config=MemoryConfig(
@@ -94,17 +113,13 @@ _MEMORY = Memory(
                 "api_key": Config.API_KEY,
             },
         },
-        embedder={
-            "provider": "huggingface",
-            "config": {
-                "model": "Qwen/Qwen3-Embedding-0.6B",
-                "embedding_dims": 1024,
-                "model_kwargs": {
-                    "trust_remote_code": True,
-                    "device": "cuda" if torch.cuda.is_available() else "cpu",
-                },
-            },
-        },
+        embedder=memory_embedder(
+            "Qwen/Qwen3-Embedding-0.6B",
+            Config.EMBED_DIM,
+            Config.EMBED_CACHE_PATH,
+            Config.EMBED_THREADS or None,
+            Config.EMBED_SERVER,
+        ),
         vector_store={
             "provider": "chroma",
             "config": {
@@ -344,5 +359,20 @@ async def search_stream():
     return response
 
 
+@app.route("/search/cache-stats", methods=["GET"])
+@login_required
+async def search_cache_stats():
+    """SPARQL result cache hit and miss counts, and the endpoints'
+    concurrency limits and circuit states."""
+    report = await asyncio.to_thread(SPARQL_CACHE.report)
+    return jsonify(
+        dict(
+            report,
+            limiters=SPARQL_LIMITERS.report(),
+            breakers=SPARQL_BREAKERS.report(),
+        )
+    )
+
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5001, debug=True)
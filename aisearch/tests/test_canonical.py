@@ -0,0 +1,10 @@
+from gnais.search.canonical import canonicalize
+
+
+def test_boolean_literals_stay_lowercase():
+    query = canonicalize(
+        "select ?s where { ?s gn:isPublic true . filter(?s != false) }"
+    )
+    assert query.text == (
+        "SELECT ?v0 WHERE { ?v0 gn:isPublic true . FILTER ( ?v0 != false ) }"
+    )
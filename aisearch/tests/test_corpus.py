@@ -0,0 +1,69 @@
+import sys
+import types
+
+from gnais.search import corpus
+
+
+class FakeCollection:
+    def __init__(self, rows: dict[str, tuple[str, dict]]):
+        self.rows = rows
+        self.metadata = {}
+
+    def update(self, ids, metadatas):
+        for doc_id, metadata in zip(ids, metadatas):
+            self.rows[doc_id] = (self.rows[doc_id][0], metadata)
+
+
+class FakeChroma:
+    collection: FakeCollection
+
+    def __init__(self, **kwargs):
+        self._collection = self.collection
+
+    def get(self, include=None, limit=None, offset=0):
+        ids = list(self._collection.rows)[offset : offset + limit]
+        return {"ids": ids, "metadatas": [self._collection.rows[i][1] for i in ids]}
+
+    def add_texts(self, texts, metadatas, ids):
+        self._collection.rows.update(zip(ids, zip(texts, metadatas)))
+
+    def delete(self, ids):
+        for doc_id in ids:
+            del self._collection.rows[doc_id]
+
+
+def _metadata(doc: str, doc_type: str) -> dict:
+    subject = doc.split(" ", 1)[0]
+    return {"source": subject, "subject": subject, "type": doc_type}
+
+
+def test_init_chroma_db_counts_each_document_once(monkeypatch):
+    unchanged = "gn:Shh is a gene."
+    retyped = "gn:Kit is a gene."
+    new = "gn:BXD_1 is a phenotype."
+    docs = corpus.Corpus(
+        [unchanged, retyped, new], shards={"gene": [[0, 2]], "phenotype": [[2, 3]]}
+    )
+    FakeChroma.collection = FakeCollection(
+        {
+            corpus.document_id(unchanged): (unchanged, _metadata(unchanged, "gene")),
+            # Stored before its type was corrected
+            corpus.document_id(retyped): (retyped, _metadata(retyped, "phenotype")),
+        }
+    )
+    monkeypatch.setitem(
+        sys.modules, "chromadb", types.SimpleNamespace(HttpClient=lambda **kw: None)
+    )
+    monkeypatch.setitem(
+        sys.modules,
+        "langchain_community.vectorstores",
+        types.SimpleNamespace(Chroma=FakeChroma),
+    )
+    monkeypatch.setattr(corpus, "get_embed_model", lambda *args: None)
+
+    _, stats = corpus.init_chroma_db(docs, embed_model="test")
+
+    assert stats == {"added": 1, "deleted": 0, "retagged": 1, "unchanged": 1}
+    rows = FakeChroma.collection.rows
+    assert rows[corpus.document_id(retyped)][1]["type"] == "gene"
+    assert rows[corpus.document_id(new)][1]["type"] == "phenotype"